@@ -0,0 +1,245 @@
+from os import environ, wait4, waitstatus_to_exitcode, cpu_count, makedirs
+from os.path import join, dirname, abspath, getsize, exists
+from subprocess import Popen, DEVNULL
+from datetime import datetime, timezone
+from random import Random
+from shutil import rmtree
+from json import dump, load
+from threading import Timer
+from time import perf_counter
+import platform
+import argparse
+import sys
+
+# Benchmarks of the scripts on synthetic data. A deterministic generator writes a DFXML
+# image, a 20 column .out file, an email export and a browser history export of the
+# requested number of rows into a work folder, then each script is run on them in its
+# own process. Wall time, throughput and the peak RSS of the script's process (worker
+# processes it starts are not included) are written to a JSON file, which can be
+# compared against an earlier run with --compare. A script that runs longer than the
+# timeout is killed and recorded as failed.
+
+REPO = dirname(abspath(__file__))
+NS = 'http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML'
+DRIVE_IDS = ['1164', '1050', '1083', '1734', '1903', '4101']
+EXTENSIONS = ['txt', 'doc', 'jpg', 'exe', 'dll', 'htm', 'gif', '']
+TOP_DIRS = ['Windows', 'Program Files', 'Documents and Settings', 'temp']
+BOTTOM_DIRS = ['system32', 'Local Settings', 'Cookies', 'My Documents', 'cache']
+EXTENSION_CATEGORIES = {'txt': 'documents', 'doc': 'documents', 'jpg': 'images', 'gif': 'images',
+                        'exe': 'executables', 'dll': 'executables', 'htm': 'web'}
+START_TIME = 820454400  # 1996-01-01
+END_TIME = 1136073600   # 2006-01-01
+TIMEOUT = 600
+
+def random_path(rng: Random, i: int, ext: str, top_dir: str=None):
+    depth = rng.randint(1, 12)
+    name = f'f{i}.{ext}' if ext else f'f{i}'
+    if depth == 1:
+        return name
+    dirs = [f'd{rng.randint(0, 30)}' for _ in range(depth - 2)]
+    return '/'.join([top_dir or rng.choice(TOP_DIRS)] + dirs + [name])
+
+def write_dfxml(file_path: str, rows: int, rng: Random, volumes: int=3):
+    with open(file_path, 'w') as file:
+        file.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<dfxml xmlns="{NS}" version="1.0">\n'
+                   '<creator><program>fiwalk</program></creator>\n')
+        per_volume = -(-rows // volumes)
+        for v, start in enumerate(range(0, rows, per_volume)):
+            file.write(f'<volume offset="{v * 1048576}">\n<partition_offset>0</partition_offset>\n')
+            for i in range(start, min(start + per_volume, rows)):
+                fo = ['<fileobject>', f'<filename>{random_path(rng, i, rng.choice(EXTENSIONS))}</filename>']
+                if rng.random() < .9:
+                    fo.append(f'<inode>{i + 1}</inode>')
+                fo.append(f'<name_type>{"d" if rng.random() < .2 else "r"}</name_type>')
+                fo.append(f'<filesize>{int(rng.lognormvariate(8, 3))}</filesize><alloc>1</alloc>')
+                for t in ('mtime', 'atime', 'crtime'):
+                    if rng.random() < .95:
+                        stamp = datetime.fromtimestamp(rng.randint(START_TIME, END_TIME), timezone.utc)
+                        fo.append(f'<{t}>{stamp.strftime("%Y-%m-%dT%H:%M:%SZ")}</{t}>')
+                fo.append('<byte_runs><byte_run file_offset="0" len="4096"/></byte_runs>')
+                fo.append(f'<hashdigest type="md5">{rng.getrandbits(128):032x}</hashdigest>'
+                          f'<hashdigest type="sha1">{rng.getrandbits(160):040x}</hashdigest>')
+                fo.append('</fileobject>\n')
+                file.write(''.join(fo))
+            file.write('</volume>\n')
+        file.write('</dfxml>\n')
+
+def write_out(file_path: str, rows: int, rng: Random):
+    with open(file_path, 'w') as file:
+        for i in range(rows):
+            data = [''] * 20
+            data[0] = f'{rng.getrandbits(160):040x}'
+            data[1] = f'{rng.getrandbits(128):032x}'
+            data[2] = rng.choice(DRIVE_IDS)
+            data[6] = rng.choice(EXTENSIONS)
+            data[7] = rng.choice(TOP_DIRS)
+            data[8] = rng.choice(BOTTOM_DIRS)
+            data[9] = str(int(rng.lognormvariate(8, 3)))
+            data[10] = '1'
+            data[12] = str(rng.randint(1, 2 * rows))
+            if rng.random() < .97:
+                for k in (13, 14, 15):
+                    data[k] = str(rng.randint(START_TIME, END_TIME))
+            data[16] = random_path(rng, i, data[6], data[7])
+            file.write(f"{'|'.join(data)}\n")
+
+def write_email_csv(file_path: str, rows: int, rng: Random, people: int=None, domains: int=50):
+    people = people or max(100, rows // 20)
+    address = lambda: f'user{int(rng.paretovariate(1.1)) % people}@domain{rng.randint(0, domains - 1)}.com'
+    with open(file_path, 'w') as file:
+        file.write('id,sender,receivers,subject\n')
+        for i in range(rows):
+            receivers = ';'.join(address() for _ in range(rng.randint(1, 4)))
+            file.write(f'{i},{address()},{receivers},subject {i}\n')
+
+def write_address_csv(file_path: str, rows: int, rng: Random, people: int=None, domains: int=50):
+    # one address in the third column, the input of graph_email_domains.py
+    people = people or max(100, rows // 20)
+    with open(file_path, 'w') as file:
+        for i in range(rows):
+            file.write(f'{i},user {i},user{int(rng.paretovariate(1.1)) % people}@domain{rng.randint(0, domains - 1)}.com\n')
+
+def write_history_csv(file_path: str, rows: int, rng: Random, sites: int=None):
+    sites = sites or max(100, rows // 50)
+    with open(file_path, 'w') as file:
+        for i in range(rows):
+            site = int(rng.paretovariate(1.2)) % sites
+            prefix = 'www.' if rng.random() < .5 else ''
+            file.write(f'{i},https://{prefix}site{site}.com/page/{rng.randint(0, 999)}?q={i},title {i}\n')
+
+def write_extensions(file_path: str):
+    # extensions.txt of the make_*_graphs scripts
+    with open(file_path, 'w') as file:
+        for ext, category in EXTENSION_CATEGORIES.items():
+            file.write(f'{ext} {category}\n')
+
+def offline_resolver(domain: str):
+    # WHOIS stand-in for graph_email_domains.py --resolver, so no lookups go to the network
+    return domain
+
+def generate(work_dir: str, rows: int, seed: int):
+    # write the inputs, each from its own seed, and return their paths by input name
+    files = {
+        'dfxml': ('image.xml', write_dfxml),
+        'out': ('big.out', write_out),
+        'email': ('emails.csv', write_email_csv),
+        'history': ('history.csv', write_history_csv),
+        'addresses': ('addresses.csv', write_address_csv),
+    }
+    paths = {}
+    for i, (name, (file_name, writer)) in enumerate(files.items()):
+        paths[name] = join(work_dir, file_name)
+        writer(paths[name], rows, Random(seed + i))
+    write_extensions(join(work_dir, 'extensions.txt'))
+    return paths
+
+# name, input, command line after 'python'
+BENCHMARKS = [
+    ('convert', 'dfxml', ['convert.py', 'image.xml']),
+    ('segregate', 'out', ['segregate.py', 'big.out', '-o', 'segregated']),
+    ('columns', 'out', ['columns.py', 'big.out']),
+    ('plot', 'out', ['plot.py', 'big.out']),
+    ('make_size_graphs', 'out', ['make_size_graphs.py', 'big.out', '2', '12']),
+    ('make_depth_graphs', 'out', ['make_depth_graphs.py', 'big.out', '2', '9']),
+    ('make_inodes_graph', 'out', ['make_inodes_graph.py', 'big.out', '1000', '150000']),
+    ('make_time_graphs', 'out', ['make_time_graphs.py', 'big.out', 'year', '1996', '2005']),
+    ('graph_email_network', 'email', ['graph_email_network.py', 'emails.csv', '--no-html']),
+    ('graph_email_domains', 'addresses', ['graph_email_domains.py', 'addresses.csv', '--cache', 'whois-cache.sqlite',
+                                      '--resolver', 'benchmark:offline_resolver']),
+    ('count_domain_hits', 'history', ['count_domain_hits.py', 'history.csv']),
+]
+
+def peak_rss_kb(usage):
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+
+def run_benchmark(name: str, input_path: str, args: list, work_dir: str, rows: int, timeout: float=TIMEOUT):
+    env = dict(environ, PYTHONPATH=REPO, MPLBACKEND='Agg')
+    t0 = perf_counter()
+    proc = Popen([sys.executable, join(REPO, args[0])] + args[1:], cwd=work_dir, env=env,
+                 stdout=DEVNULL, stderr=DEVNULL)
+    timer = Timer(timeout, proc.kill)
+    timer.start()
+    try:
+        _, status, usage = wait4(proc.pid, 0)
+    finally:
+        timer.cancel()
+    proc.returncode = waitstatus_to_exitcode(status)
+    seconds = perf_counter() - t0
+    size = getsize(input_path)
+    return {
+        'name': name,
+        'returncode': proc.returncode,
+        'timed_out': seconds >= timeout,
+        'seconds': round(seconds, 4),
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 4),
+        'rows': rows,
+        'rows_per_second': round(rows / seconds, 1),
+        'input_bytes': size,
+        'mb_per_second': round(size / seconds / 1e6, 3),
+        'peak_rss_kb': peak_rss_kb(usage),
+    }
+
+def print_results(results: list, baseline: dict=None):
+    before = {r['name']: r for r in baseline['benchmarks']} if baseline else {}
+    for r in results:
+        line = f"{r['name']:<22}{r['seconds']:>10.3f}s {r['rows_per_second']:>14.1f} rows/s {r['peak_rss_kb'] / 1024:>9.1f} MB"
+        if r.get('timed_out'):
+            line += '  FAILED (timed out)'
+        elif r['returncode']:
+            line += f"  FAILED ({r['returncode']})"
+        old = before.get(r['name'])
+        if old:
+            line += f"  {r['seconds'] / old['seconds']:.2f}x time {r['peak_rss_kb'] / old['peak_rss_kb']:.2f}x memory"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the scripts on synthetic data.')
+    parser.add_argument('-n', '--rows', type=int, default=10000, help='rows in each generated file (10k to 10M)')
+    parser.add_argument('-s', '--seed', type=int, default=1)
+    parser.add_argument('-d', '--work-dir', default='benchmark-data', help='folder for the generated data')
+    parser.add_argument('-o', '--output', help='results file, by default benchmark-<rows>.json')
+    parser.add_argument('-b', '--only', nargs='+', metavar='NAME', help='only run these benchmarks')
+    parser.add_argument('--compare', metavar='JSON', help='earlier results to compare against')
+    parser.add_argument('--reuse', action='store_true', help='keep data already in the work folder')
+    parser.add_argument('-t', '--timeout', type=float, default=TIMEOUT,
+                        help=f'seconds before a benchmark is killed and recorded as failed (default {TIMEOUT})')
+    args = parser.parse_args()
+
+    if not args.reuse and exists(args.work_dir):
+        rmtree(args.work_dir)
+    makedirs(args.work_dir, exist_ok=True)
+
+    t0 = perf_counter()
+    print(f'Generating {args.rows} rows of data...', end=' ', flush=True)
+    inputs = [('dfxml', 'image.xml'), ('out', 'big.out'), ('email', 'emails.csv'), ('history', 'history.csv'),
+              ('addresses', 'addresses.csv')]
+    if args.reuse and all(exists(join(args.work_dir, file_name)) for _, file_name in inputs):
+        paths = {name: join(args.work_dir, file_name) for name, file_name in inputs}
+    else:
+        paths = generate(args.work_dir, args.rows, args.seed)
+    print(f'completed in {round(perf_counter() - t0, 4)} seconds.')
+
+    results = []
+    for name, input_name, command in BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+        results.append(run_benchmark(name, paths[input_name], command, args.work_dir, args.rows, args.timeout))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = load(file)
+    print_results(results, baseline)
+
+    with open(args.output or f'benchmark-{args.rows}.json', 'w') as file:
+        dump({
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'rows': args.rows,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': cpu_count(),
+            'benchmarks': results,
+        }, file, indent=3)
@@ -0,0 +1,21 @@
+from functools import lru_cache
+
+EXTENSIONS_FILE = 'extensions.txt'
+
+@lru_cache(maxsize=None)
+def get_extensions(file_path: str=EXTENSIONS_FILE):
+    # load the dir and extensions categories on first use
+    extensions = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.split(' ')
+            extensions[line[0].strip()] = line[1].strip()
+    return extensions
+
+def get_suffix(path: str):
+    # lower case extension of the file name, None if it has no extension
+    file_name = path[path.rfind('/') + 1:].lower()
+    dot_index = file_name.rfind('.')
+    if dot_index > -1:
+        return file_name[dot_index + 1:]
+    return None
@@ -0,0 +1,304 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from json import load, dump
+from mmap import mmap, ACCESS_READ
+from multiprocessing import get_context, get_all_start_methods
+from os import stat, replace, mkdir, environ, cpu_count
+from os.path import join, exists, isfile
+from shutil import rmtree, copyfileobj
+from time import time
+import argparse
+import numpy as np
+from categories import get_suffix
+from compressed import open_file, is_compressed, find_line_ranges
+from instrument import stage
+
+# Columnar cache of the 20 column .out format. A .out file is parsed once into
+# <file>.out.cols/ and every later load is a set of memory-mapped .npy arrays. Only the
+# columns the reports use are kept; category columns are stored as codes of the smallest
+# unsigned type that fits their dictionary. Large files are parsed in parallel, see
+# compile_columns(); COLUMNS_JOBS sets the number of worker processes.
+
+CACHE_SUFFIX = '.cols'
+VERSION = 3
+MISSING = np.iinfo(np.int64).min   # value stored for empty integer fields
+
+# column name -> index in the .out row
+INT_COLUMNS = {
+    'inode': 12,
+    'size': 9,
+    'crtime': 13,
+    'mtime': 14,
+    'atime': 15,
+}
+CATEGORY_COLUMNS = {
+    'ext': 6,
+    'topdir': 7,
+    'botdir': 8,
+}
+PATH_INDEX = 16
+CODE_COLUMNS = list(CATEGORY_COLUMNS) + ['suffix']
+MIN_CHUNK = 1 << 24   # smallest byte range parsed by a worker
+
+def get_cache_dir(out_path: str):
+    return out_path + CACHE_SUFFIX
+
+def source_signature(out_path: str):
+    st = stat(out_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def is_stale(out_path: str):
+    meta_path = join(get_cache_dir(out_path), 'meta.json')
+    if not isfile(meta_path):
+        return True
+    with open(meta_path, 'r') as file:
+        meta = load(file)
+    return meta.get('version') != VERSION or meta.get('source') != source_signature(out_path)
+
+def code_dtype(count: int):
+    # smallest unsigned type for the codes of a dictionary of count labels
+    for dtype in (np.uint8, np.uint16):
+        if count <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint32
+
+def to_int(value: str):
+    return int(value) if value else MISSING
+
+def get_jobs():
+    return int(environ.get('COLUMNS_JOBS', 0)) or cpu_count() or 1
+
+def iter_range(out_path: str, start: int, end: int):
+    # lines of the byte range [start, end), read through a memory map
+    with open(out_path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as data:
+        data.seek(start)
+        while data.tell() < end:
+            yield data.readline()
+
+def parse_part(lines, part_dir: str, row_offset: int=0):
+    # parse .out lines into the arrays of one part of the cache, with codes numbered in a
+    # dictionary of the part's own. Returns the row and byte count and the dictionaries.
+    mkdir(part_dir)
+    ints = {name: array('q') for name in INT_COLUMNS}
+    depth = array('i')
+    vocabs = {name: {} for name in CODE_COLUMNS}
+    codes = {name: array('i') for name in vocabs}
+    path_offsets = array('q', [0])
+    row_offsets = array('q')
+    start = row_offset
+
+    with open(join(part_dir, 'paths.bin'), 'wb') as paths:
+        offset = 0
+        for raw in lines:
+            row_offsets.append(row_offset)
+            row_offset += len(raw)
+            line = raw.decode('utf-8').rstrip().split('|')
+            for name, index in INT_COLUMNS.items():
+                ints[name].append(to_int(line[index]))
+            for name, index in CATEGORY_COLUMNS.items():
+                vocab = vocabs[name]
+                codes[name].append(vocab.setdefault(line[index], len(vocab)))
+
+            path = line[PATH_INDEX]
+            depth.append(path.count('/') + 1)
+            vocab = vocabs['suffix']
+            codes['suffix'].append(vocab.setdefault(get_suffix(path), len(vocab)))
+
+            data = path.encode('utf-8')
+            paths.write(data)
+            offset += len(data)
+            path_offsets.append(offset)
+
+    for name, values in ints.items():
+        np.save(join(part_dir, f'{name}.npy'), np.frombuffer(values, dtype=np.int64))
+    np.save(join(part_dir, 'depth.npy'), np.frombuffer(depth, dtype=np.int32))
+    np.save(join(part_dir, 'path_offsets.npy'), np.frombuffer(path_offsets, dtype=np.int64))
+    np.save(join(part_dir, 'offset.npy'), np.frombuffer(row_offsets, dtype=np.int64))
+    for name, values in codes.items():
+        np.save(join(part_dir, f'{name}.npy'), np.frombuffer(values, dtype=np.int32))
+    return len(row_offsets), row_offset - start, {name: list(vocab) for name, vocab in vocabs.items()}
+
+def parse_range(out_path: str, start: int, end: int, part_dir: str):
+    return parse_part(iter_range(out_path, start, end), part_dir, start)
+
+def merge_columns(parts: list, tmp_dir: str):
+    # write the arrays of the parts, in order, into the cache. Each part's codes are mapped
+    # to one dictionary that lists the labels in order of first appearance in the file,
+    # so the cache is the same as that of a sequential parse.
+    part_dirs = [part_dir for part_dir, _ in parts]
+    rows = sum(len(np.load(join(d, 'offset.npy'), mmap_mode='r')) for d in part_dirs)
+
+    def merge(name: str, dtype, transform=None):
+        out = np.lib.format.open_memmap(join(tmp_dir, f'{name}.npy'), mode='w+', dtype=dtype, shape=(rows,))
+        pos = 0
+        for i, part_dir in enumerate(part_dirs):
+            values = np.load(join(part_dir, f'{name}.npy'), mmap_mode='r')
+            out[pos:pos + len(values)] = transform(i, values) if transform else values
+            pos += len(values)
+        out.flush()
+        del out
+
+    for name in list(INT_COLUMNS) + ['offset']:
+        merge(name, np.int64)
+    merge('depth', np.int32)
+
+    for name in CODE_COLUMNS:
+        vocab = {}
+        code_maps = []
+        for _, labels in parts:
+            code_maps.append(np.array([vocab.setdefault(l, len(vocab)) for l in labels[name]], dtype=np.int64))
+        merge(name, code_dtype(len(vocab)), lambda i, codes: code_maps[i][codes] if len(codes) else codes)
+        with open(join(tmp_dir, f'{name}.json'), 'w') as file:
+            dump(list(vocab), file)
+
+    path_offsets = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    with open(join(tmp_dir, 'paths.bin'), 'wb') as out:
+        for part_dir in part_dirs:
+            offsets = np.load(join(part_dir, 'path_offsets.npy'), mmap_mode='r')
+            path_offsets.append(offsets[1:] + base)
+            base += int(offsets[-1])
+            with open(join(part_dir, 'paths.bin'), 'rb') as file:
+                copyfileobj(file, out, 1 << 24)
+    np.save(join(tmp_dir, 'path_offsets.npy'), np.concatenate(path_offsets))
+
+    for part_dir in part_dirs:
+        rmtree(part_dir)
+    return rows
+
+def compile_columns(out_path: str, jobs: int=None):
+    # the .out file is memory-mapped and its line aligned byte ranges are parsed in a pool
+    # of worker processes, at most one per MIN_CHUNK bytes. A compressed .out file cannot
+    # be mapped and is parsed in one pass while it is decompressed.
+    signature = source_signature(out_path)
+    cache_dir = get_cache_dir(out_path)
+    tmp_dir = cache_dir + '.tmp'
+    if exists(tmp_dir):
+        rmtree(tmp_dir)
+    mkdir(tmp_dir)
+
+    size = signature['size']
+    jobs = min(jobs or get_jobs(), size // MIN_CHUNK + 1)
+    if jobs > 1 and 'fork' not in get_all_start_methods():
+        jobs = 1
+    with stage('parse', file=out_path, jobs=jobs) as s:
+        if size == 0 or is_compressed(out_path):
+            with open_file(out_path, 'rb') as file:
+                results = [parse_part(file, join(tmp_dir, 'part0'))]
+        else:
+            ranges = find_line_ranges(out_path, jobs)
+            part_dirs = [join(tmp_dir, f'part{i}') for i in range(len(ranges))]
+            if len(ranges) > 1:
+                # forked, like the render pool, so plot.py is not re-executed in the workers
+                with ProcessPoolExecutor(len(ranges), mp_context=get_context('fork')) as pool:
+                    futures = [pool.submit(parse_range, out_path, start, end, part_dir)
+                               for (start, end), part_dir in zip(ranges, part_dirs)]
+                    results = [f.result() for f in futures]
+            else:
+                results = [parse_range(out_path, 0, size, part_dirs[0])]
+        s.rows = sum(r[0] for r in results)
+        s.bytes = sum(r[1] for r in results)
+
+    with stage('merge', rows=s.rows):
+        rows = merge_columns([(join(tmp_dir, f'part{i}'), r[2]) for i, r in enumerate(results)], tmp_dir)
+
+    with open(join(tmp_dir, 'meta.json'), 'w') as file:
+        dump({'version': VERSION, 'source': signature, 'rows': rows}, file)
+
+    if exists(cache_dir):
+        rmtree(cache_dir)
+    replace(tmp_dir, cache_dir)
+    return cache_dir
+
+class Columns:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        with open(join(cache_dir, 'meta.json'), 'r') as file:
+            self.rows = load(file)['rows']
+        self._arrays = {}
+        self._labels = {}
+        self._paths = None
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name: str):
+        # inode, size, crtime, mtime, atime, depth, path_offsets, offset (byte offset of
+        # each row in the .out file) or the codes of a category column (ext, topdir,
+        # botdir, suffix)
+        if name not in self._arrays:
+            self._arrays[name] = np.load(join(self.cache_dir, f'{name}.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def labels(self, name: str):
+        if name not in self._labels:
+            with open(join(self.cache_dir, f'{name}.json'), 'r') as file:
+                self._labels[name] = load(file)
+        return self._labels[name]
+
+    def categories(self, name: str, mapping: dict=None):
+        # return the codes and labels of a category column, with the labels translated
+        # through mapping (e.g. the extension categories). Labels that map to the same
+        # value are merged, which only touches the dictionary, not the rows.
+        labels = self.labels(name)
+        codes = self[name]
+        if not mapping:
+            return codes, labels
+        merged = {}
+        code_map = [merged.setdefault(mapping.get(l, l), len(merged)) for l in labels]
+        code_map = np.array(code_map, dtype=code_dtype(len(merged)))
+        return code_map[codes] if len(code_map) else codes, list(merged)
+
+    def path(self, row: int):
+        if self._paths is None:
+            if self['path_offsets'][-1] == 0:
+                self._paths = b''
+            else:
+                with open(join(self.cache_dir, 'paths.bin'), 'rb') as file:
+                    self._paths = mmap(file.fileno(), 0, access=ACCESS_READ)
+        offsets = self['path_offsets']
+        return self._paths[offsets[row]:offsets[row + 1]].decode('utf-8')
+
+    def paths(self, rows):
+        return [self.path(row) for row in rows]
+
+def open_columns(out_path: str):
+    # load the columnar cache of a .out file, compiling it first if it is missing or stale
+    if is_stale(out_path):
+        compile_columns(out_path)
+    return Columns(get_cache_dir(out_path))
+
+def ordered_groups(codes: np.ndarray):
+    # unique codes in order of first appearance
+    unique, first = np.unique(codes, return_index=True)
+    return unique[np.argsort(first, kind='stable')]
+
+def count_by_category(codes: np.ndarray, labels: list, bins: np.ndarray, length: int):
+    # per-bin counts of each category, keyed by label in order of first appearance
+    counts = np.bincount(codes.astype(np.int64) * length + bins,
+                         minlength=len(labels) * length).reshape(-1, length)
+    return {labels[c]: counts[c] for c in ordered_groups(codes)}
+
+def group_rows(codes: np.ndarray, labels: list, rows: np.ndarray):
+    # row numbers of each category, keyed by label in order of first appearance.
+    # Rows keep their file order within a category.
+    order = ordered_groups(codes)
+    sort = np.argsort(codes, kind='stable')
+    sorted_codes = codes[sort]
+    starts = np.searchsorted(sorted_codes, order, 'left')
+    ends = np.searchsorted(sorted_codes, order, 'right')
+    return {labels[c]: rows[sort[s:e]] for c, s, e in zip(order, starts, ends)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile the columnar cache of .out files.')
+    parser.add_argument('files', nargs='+', metavar='OUT_FILE')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (by default $COLUMNS_JOBS or the number of cores)')
+    args = parser.parse_args()
+
+    for out_path in args.files:
+        t0 = time()
+        print(f'Compiling {out_path}...', end=' ', flush=True)
+        compile_columns(out_path, args.jobs)
+        print(f'completed in {round(time() - t0, 4)} seconds.')
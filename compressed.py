@@ -0,0 +1,165 @@
+from io import TextIOWrapper, BufferedReader, BufferedWriter
+from os import environ
+from os.path import basename, getsize
+from shutil import which
+from subprocess import Popen, PIPE, DEVNULL
+import gzip
+
+try:
+    from signal import SIGPIPE
+except ImportError:   # not available on Windows
+    SIGPIPE = None
+
+# Transparent gzip and zstd files. Readers detect the format from the first bytes of the
+# file, writers from its extension (.gz or .zst). Where pigz or the zstd command line tool
+# is installed the data is (de)compressed by that process and piped, which overlaps it
+# with the parsing in this one and compresses on all cores (pigz, zstd -T0). Otherwise
+# gzip, or the zstandard module if it is installed, runs in this process. Set
+# COMPRESSION_TOOLS=0 to never use the command line tools.
+#
+# A single gzip or zstd stream cannot be split into independently decodable pieces, so
+# compressed inputs are read sequentially; find_line_ranges() splits uncompressed ones
+# for parallel readers. Files written in parts can be compressed part by part and
+# concatenated, since concatenated gzip members and zstd frames are still one valid file.
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+FORMAT_SUFFIXES = {'gz': '.gz', 'gzip': '.gz', 'zst': '.zst', 'zstd': '.zst'}
+TOOLS_ENV = 'COMPRESSION_TOOLS'
+
+def detect(file_path: str):
+    # 'gzip', 'zstd' or None for an uncompressed file
+    with open(file_path, 'rb') as file:
+        magic = file.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if magic == ZSTD_MAGIC:
+        return 'zstd'
+    return None
+
+def is_compressed(file_path: str):
+    return detect(file_path) is not None
+
+def get_format(file_path: str):
+    # compression format of a file name, from its extension
+    for suffix, fmt in SUFFIXES.items():
+        if file_path.endswith(suffix):
+            return fmt
+    return None
+
+def strip_suffix(file_name: str):
+    # file name without a compression extension, e.g. for naming outputs
+    for suffix in SUFFIXES:
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return file_name
+
+def get_suffix(compression: str):
+    # extension for a --compress argument (gz, gzip, zst, zstd or None)
+    if not compression:
+        return ''
+    return FORMAT_SUFFIXES[compression]
+
+def get_tool(fmt: str):
+    if environ.get(TOOLS_ENV, '1') == '0':
+        return None
+    return which('pigz') if fmt == 'gzip' else which('zstd')
+
+class PipeFile:
+    # binary file object over the stdin or stdout of a (de)compression process
+    def __init__(self, proc: Popen, stream, target=None, name: str=None):
+        self._proc = proc
+        self._stream = stream
+        self._target = target
+        self.name = name
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        return iter(self._stream)
+
+    def close(self):
+        if self._stream.closed:
+            return
+        self._stream.close()
+        code = self._proc.wait()
+        if self._target is not None:
+            self._target.close()
+        elif SIGPIPE is not None and code == -SIGPIPE:
+            # a reader closed before the end of the file, which stops the tool on its next write
+            code = 0
+        if code:
+            raise OSError(f'{self._proc.args[0]} exited with {code} for {self.name}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_read(file_path: str, fmt: str):
+    tool = get_tool(fmt)
+    if tool is not None:
+        proc = Popen([tool, '-dc', file_path], stdout=PIPE, stderr=DEVNULL)
+        return PipeFile(proc, proc.stdout, name=file_path)
+    if fmt == 'gzip':
+        return gzip.open(file_path, 'rb')
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f'Reading {file_path} needs the zstd command or the zstandard module')
+    return BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True))
+
+def open_write(file_path: str, fmt: str):
+    tool = get_tool(fmt)
+    if tool is not None:
+        target = open(file_path, 'wb')
+        args = [tool, '-c'] if fmt == 'gzip' else [tool, '-q', '-c', '-T0']
+        proc = Popen(args, stdin=PIPE, stdout=target)
+        return PipeFile(proc, proc.stdin, target, file_path)
+    if fmt == 'gzip':
+        return gzip.open(file_path, 'wb')
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f'Writing {file_path} needs the zstd command or the zstandard module')
+    writer = zstandard.ZstdCompressor(threads=-1).stream_writer(open(file_path, 'wb'), closefd=True)
+    return BufferedWriter(writer)
+
+def open_file(file_path: str, mode: str='r', encoding: str='utf-8'):
+    # open() for 'r', 'rb', 'w' and 'wb' that reads compressed files as if they were not,
+    # and compresses files written with a .gz or .zst extension
+    binary = 'b' in mode
+    if mode[0] == 'r':
+        fmt = detect(file_path)
+        if fmt is None:
+            return open(file_path, mode, encoding=None if binary else encoding)
+        file = open_read(file_path, fmt)
+    else:
+        fmt = get_format(file_path)
+        if fmt is None:
+            return open(file_path, mode, encoding=None if binary else encoding)
+        file = open_write(file_path, fmt)
+    return file if binary else TextIOWrapper(file, encoding=encoding)
+
+def find_line_ranges(file_path: str, chunks: int):
+    # split an uncompressed file into about equal byte ranges that start at the beginning
+    # of a line, for reading in parallel
+    size = getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as file:
+        for i in range(1, chunks):
+            pos = max(size * i // chunks, bounds[-1])
+            if pos > 0:
+                file.seek(pos - 1)
+                file.readline()
+                pos = file.tell()
+            bounds.append(min(pos, size))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+def get_name(file_path: str):
+    # base name of a file without its compression extension
+    return strip_suffix(basename(file_path))
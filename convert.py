@@ -1,14 +1,52 @@
 # Read the file as XML
 import xml.etree.ElementTree as et
 from datetime import datetime
+from functools import lru_cache
 from time import time
 from sys import argv
 from _io import TextIOWrapper
 from typing import List
-from os.path import basename
+from os import remove, environ, replace
+from os.path import getsize, isfile
+from hashlib import blake2b
+from json import load, dump
+from mmap import mmap, ACCESS_READ
+from shutil import copyfileobj
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import re
+from instrument import stage
+from compressed import open_file, is_compressed, get_name, get_suffix
+from columns import source_signature
 
 NS = '{http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML}'
-TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+VOLUME_START = re.compile(rb'<volume[\s>]')
+VOLUME_END = b'</volume>'
+ROOT_START = re.compile(rb'<(?![?!])[^>]*>')   # first start tag, skipping <?xml ?> and comments
+CHUNK_SIZE = 1 << 20
+PARSER_ENV = 'DFXML_PARSER'   # etree, lxml, or auto (lxml if it is installed)
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_VERSION = 2
+
+# .out column of each fileobject child that is copied as is, or converted to epoch seconds
+TEXT_COLUMNS = {f"{NS}inode": 12, f"{NS}filesize": 9, f"{NS}alloc": 10, f"{NS}filename": 16}
+TIME_COLUMNS = {f"{NS}crtime": 13, f"{NS}mtime": 14, f"{NS}atime": 15}
+NAME_TYPE_TAG = f"{NS}name_type"
+HASHDIGEST_TAG = f"{NS}hashdigest"
+HASH_COLUMNS = {'md5': 1, 'sha1': 0}
+
+def get_etree():
+    # the ElementTree implementation used for parsing
+    choice = environ.get(PARSER_ENV, 'auto')
+    if choice in ('lxml', 'auto'):
+        try:
+            from lxml import etree
+            return etree
+        except ImportError:
+            if choice == 'lxml':
+                raise
+    return et
 
 def load_xml(file_path):
     t0 = time()
@@ -27,64 +65,328 @@ def get_element(el: et.ElementTree, name: str):
         return el.text
     return ''
 
+@lru_cache(maxsize=1 << 17)
+def get_hour_seconds(hour_str: str):
+    # epoch seconds of the start of a YYYY-MM-DDTHH hour in local time, or None if the UTC
+    # offset changes within the hour, in which case its times are converted one by one
+    hour = datetime(int(hour_str[:4]), int(hour_str[5:7]), int(hour_str[8:10]), int(hour_str[11:13]))
+    start = round(hour.timestamp())
+    if round(hour.replace(minute=59, second=59).timestamp()) - start != 3599:
+        return None
+    return start
+
+def to_epoch(date_str: str):
+    # epoch seconds of an ISO-8601 time. Like the strptime('%Y-%m-%dT%H:%M:%SZ') conversion
+    # this replaces, times without an offset, or with a 'Z', are read as local time. The
+    # fixed format of fiwalk is sliced directly, any other form goes through datetime.
+    if len(date_str) == 20 and date_str[19] == 'Z' and date_str[10] == 'T':
+        start = get_hour_seconds(date_str[:13])
+        if start is not None:
+            return start + int(date_str[14:16]) * 60 + int(date_str[17:19])
+    return round(datetime.fromisoformat(date_str.rstrip('Z')).timestamp())
+
 def get_seconds_time(el: et.ElementTree, name: str):
     date_str = get_element(el, name)
     if date_str:
-        return str(round(datetime.strptime(date_str, TIME_FORMAT).timestamp()))
+        return str(to_epoch(date_str))
     return ''
 
+def save_fileobject(fo: et.Element, file: TextIOWrapper):
+    # one pass over the children, dispatched on their qualified tags
+    data = [''] * 20
+    has_inode = False
+    name_type = None
+    for child in fo:
+        tag = child.tag
+        index = TEXT_COLUMNS.get(tag)
+        if index is not None:
+            data[index] = child.text or ''
+            if index == 12:
+                has_inode = True
+            continue
+        index = TIME_COLUMNS.get(tag)
+        if index is not None:
+            if child.text:
+                data[index] = str(to_epoch(child.text))
+        elif tag == NAME_TYPE_TAG:
+            name_type = child.text
+        elif tag == HASHDIGEST_TAG:
+            index = HASH_COLUMNS.get(child.get('type', ''))
+            if index is not None:
+                data[index] = child.text or ''
+
+    # only include a file object if it is a regular file and has an inode
+    if has_inode and name_type == 'r':
+        file.write(f"{'|'.join(data)}\n")
+
 def save_metadata(vol: et.ElementTree, file:TextIOWrapper):
     for fo in vol.findall(f"{NS}fileobject"):
-        # only include a file object if it is a regular file and has an inode
-        inode = fo.find(f"{NS}inode")
-        name_type = fo.find(f"{NS}name_type").text
+        save_fileobject(fo, file)
+
+def select_fileobjects(events):
+    # yield each fileobject of each volume as soon as it is complete. Finished fileobjects
+    # and volumes are detached from the tree so memory use does not grow with the size of
+    # the file.
+    volume_tag = f"{NS}volume"
+    fileobject_tag = f"{NS}fileobject"
+    path = []
+    for event, el in events:
+        if event == 'start':
+            path.append(el)
+            continue
+
+        path.pop()
+        if el.tag == fileobject_tag:
+            # same selection as get_volumes() + save_metadata(): <dfxml>/<volume>/<fileobject>
+            if len(path) == 2 and path[1].tag == volume_tag:
+                yield el
+            el.clear()
+            path[-1].remove(el)
+        elif el.tag == volume_tag and len(path) == 1:
+            el.clear()
+            path[-1].remove(el)
+
+def iter_fileobjects(file_path: str):
+    # the file may be gzip or zstd compressed, it is decompressed while it is parsed
+    with open_file(file_path, 'rb') as file:
+        yield from select_fileobjects(get_etree().iterparse(file, events=('start', 'end')))
+
+def iter_volume_fileobjects(file_path: str, header_end: int, start: int, end: int):
+    # parse a single volume by feeding the document header (everything before the first
+    # volume, which declares the namespace) followed by the volume's byte range
+    def events():
+        parser = get_etree().XMLPullParser(events=('start', 'end'))
+        with open(file_path, 'rb') as file:
+            parser.feed(file.read(header_end))
+            yield from parser.read_events()
+            file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                parser.feed(chunk)
+                yield from parser.read_events()
+        # the root element is never closed, so the parser is not closed either
+
+    return select_fileobjects(events())
+
+def stream_metadata(file_path: str, file: TextIOWrapper):
+    # returns the number of fileobjects read
+    count = 0
+    for fo in iter_fileobjects(file_path):
+        save_fileobject(fo, file)
+        count += 1
+    return count
 
-        if inode is not None and name_type == 'r':
-            # create a list with 20 items
-            data = [''] * 20
+def find_volumes(file_path: str):
+    # locate the byte range of each volume without parsing the xml
+    if is_compressed(file_path):
+        raise ValueError(f'{file_path} is compressed, its volumes can only be converted in one pass')
+    ranges = []
+    with open(file_path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as data:
+        pos = 0
+        while True:
+            match = VOLUME_START.search(data, pos)
+            if match is None:
+                break
+            end = data.find(VOLUME_END, match.end())
+            if end < 0:
+                raise ValueError(f'Unterminated volume at byte {match.start()} of {file_path}')
+            pos = end + len(VOLUME_END)
+            ranges.append((match.start(), pos))
+    return ranges
 
-            # save the inode
-            data[12] = inode.text
+def get_output_name(file_path: str, suffix: str='', compression: str=None):
+    # compression is gz or zst to name a compressed .out file
+    file_name = get_name(file_path)
+    ext_index = file_name.rfind('.')
+    if ext_index > -1:
+        file_name = file_name[:ext_index]
+    return f'{file_name}{suffix}.out{get_suffix(compression)}'
+
+def convert_file(file_path: str, out_path: str):
+    with stage('convert', file=file_path, bytes=getsize(file_path)) as s, open_file(out_path, 'w') as file:
+        s.rows = stream_metadata(file_path, file)
+    return out_path
+
+def convert_volume(file_path: str, header_end: int, start: int, end: int, out_path: str):
+    with open_file(out_path, 'w') as file:
+        for fo in iter_volume_fileobjects(file_path, header_end, start, end):
+            save_fileobject(fo, file)
+    return out_path
+
+def merge_shards(shards: List[str], out_path: str):
+    # concatenate in the given order (input order, then volume order) regardless of
+    # which worker finished first, so the result matches a serial conversion. Compressed
+    # shards are concatenated as they are, which is still a valid gzip or zstd file.
+    if out_path in shards:
+        raise ValueError(f'{out_path} is one of the shards being merged')
+    with stage('merge', file=out_path) as s, open(out_path, 'wb') as out:
+        for shard in shards:
+            s.bytes += getsize(shard)
+            with open(shard, 'rb') as file:
+                copyfileobj(file, out, CHUNK_SIZE)
+            remove(shard)
+    return out_path
+
+def convert_batch(file_paths: List[str], jobs: int=None, split_volumes: bool=False, compression: str=None):
+    # build one task per file, or one per volume, and run them in a process pool.
+    # Returns the shard paths in deterministic order. Inputs with the same name, e.g.
+    # a/fiwalk.xml and b/fiwalk.xml, get their input index in their shard names so they
+    # do not overwrite each other.
+    names = Counter(get_output_name(file_path) for file_path in file_paths)
+    tasks = []
+    for n, file_path in enumerate(file_paths):
+        prefix = f'-in{n}' if names[get_output_name(file_path)] > 1 else ''
+        if not split_volumes:
+            tasks.append((convert_file, file_path, get_output_name(file_path, prefix, compression)))
+            continue
+        volumes = find_volumes(file_path)
+        if not volumes:
+            continue
+        header_end = volumes[0][0]
+        for i, (start, end) in enumerate(volumes):
+            tasks.append((convert_volume, file_path, header_end, start, end,
+                          get_output_name(file_path, f'{prefix}-vol{i}', compression)))
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(*task) for task in tasks]
+        return [f.result() for f in futures]
 
-            # save the hash digests
-            hashdigests = fo.findall(f"{NS}hashdigest")
-            for h in hashdigests:
-                if h.get('type', '') == 'md5':
-                    data[1] = h.text
-                elif h.get('type', '') == 'sha1':
-                    data[0] = h.text
+# Incremental conversion. Next to <name>.out, <name>.out.manifest.json keeps a hash of the
+# root start tag, whose namespace declarations are all a volume's parse depends on (the
+# rest of the header, such as fiwalk's start time and command line, changes on every
+# run), and of each volume's bytes, with the byte range of that volume's rows
+# in the .out file. On the next run only volumes whose hash is not in the manifest are
+# parsed; the rows of the others are copied from the previous .out file. A compressed .out
+# file is written as one gzip member or zstd frame per volume, so the byte ranges can be
+# copied without decompressing them.
 
-            # get the file size
-            data[9] = get_element(fo, 'filesize')
+def hash_range(data, start: int, end: int):
+    h = blake2b(digest_size=16)
+    for pos in range(start, end, CHUNK_SIZE):
+        h.update(data[pos:min(pos + CHUNK_SIZE, end)])
+    return h.hexdigest()
 
-            # get the allocated value
-            data[10] = get_element(fo, 'alloc')
+def fingerprint_volumes(file_path: str):
+    # hash of the root start tag, and (start, end, hash) of each volume
+    volumes = find_volumes(file_path)
+    with open(file_path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as data:
+        header_end = volumes[0][0] if volumes else len(data)
+        root = ROOT_START.search(data, 0, header_end)
+        root_hash = hash_range(data, root.start(), root.end()) if root else hash_range(data, 0, 0)
+        return root_hash, [(start, end, hash_range(data, start, end)) for start, end in volumes]
 
-            # get the mac times
-            data[13] = get_seconds_time(fo, 'crtime')
-            data[14] = get_seconds_time(fo, 'mtime')
-            data[15] = get_seconds_time(fo, 'atime')
+def load_manifest(out_path: str):
+    # the manifest of out_path, or None if there is none or the .out file was changed since
+    manifest_path = out_path + MANIFEST_SUFFIX
+    if not isfile(manifest_path) or not isfile(out_path):
+        return None
+    with open(manifest_path, 'r') as file:
+        manifest = load(file)
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('out') != source_signature(out_path):
+        return None
+    return manifest
 
-            # get the path
-            data[16] = get_element(fo, 'filename')
+def copy_range(src, dst, start: int, length: int):
+    src.seek(start)
+    while length > 0:
+        chunk = src.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            raise ValueError(f'{src.name} is shorter than its manifest')
+        dst.write(chunk)
+        length -= len(chunk)
 
-            file.write(f"{'|'.join(data)}\n")
+def convert_incremental(file_path: str, out_path: str, jobs: int=None, compression: str=None):
+    # returns the number of volumes converted and the number of volumes
+    with stage('fingerprint', file=file_path, bytes=getsize(file_path)):
+        root, volumes = fingerprint_volumes(file_path)
+    manifest = load_manifest(out_path)
+    previous = {}
+    if manifest and manifest['root'] == root:
+        for volume in manifest['volumes']:
+            previous.setdefault(volume['hash'], volume)
+
+    header_end = volumes[0][0] if volumes else 0
+    tasks = [(i, start, end, get_output_name(file_path, f'-vol{i}', compression))
+             for i, (start, end, h) in enumerate(volumes) if h not in previous]
+    with stage('convert', volumes=len(tasks)):
+        if len(tasks) > 1 and jobs != 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = {i: pool.submit(convert_volume, file_path, header_end, start, end, shard)
+                           for i, start, end, shard in tasks}
+                shards = {i: f.result() for i, f in futures.items()}
+        else:
+            shards = {i: convert_volume(file_path, header_end, start, end, shard) for i, start, end, shard in tasks}
+
+    entries = []
+    tmp_path = out_path + '.tmp'
+    with stage('write', file=out_path) as s, open(tmp_path, 'wb') as out:
+        old = open(out_path, 'rb') if previous else None
+        try:
+            for i, (start, end, h) in enumerate(volumes):
+                out_start = out.tell()
+                if i in shards:
+                    with open(shards[i], 'rb') as file:
+                        copyfileobj(file, out, CHUNK_SIZE)
+                    remove(shards[i])
+                else:
+                    copy_range(old, out, previous[h]['out_start'], previous[h]['out_length'])
+                entries.append({'start': start, 'end': end, 'hash': h,
+                                'out_start': out_start, 'out_length': out.tell() - out_start})
+        finally:
+            if old is not None:
+                old.close()
+        s.bytes = out.tell()
+    replace(tmp_path, out_path)
+
+    with open(out_path + MANIFEST_SUFFIX, 'w') as file:
+        dump({'version': MANIFEST_VERSION, 'source': file_path, 'root': root,
+              'out': source_signature(out_path), 'volumes': entries}, file, indent=1)
+    return len(tasks), len(volumes)
 
 
 if __name__ == '__main__':
-    doc = load_xml(argv[1])
-    volumes = get_volumes(doc)
+    parser = argparse.ArgumentParser(description='Convert DFXML files to the 20 column .out format.')
+    parser.add_argument('files', nargs='+', metavar='DFXML_FILE')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (defaults to the number of cores)')
+    parser.add_argument('--split-volumes', action='store_true',
+                        help='convert each volume in its own worker and write one shard per volume')
+    parser.add_argument('--merge', metavar='OUT_FILE',
+                        help='concatenate all shards, in input and volume order, into OUT_FILE')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only convert the volumes that changed since the last --incremental run')
+    parser.add_argument('-z', '--compress', choices=['gz', 'zst'],
+                        help='compress the .out files (compressed DFXML files are read as they are)')
+    parser.add_argument('--parser', choices=['auto', 'etree', 'lxml'],
+                        help=f'XML parser, by default ${PARSER_ENV} or auto (lxml if it is installed)')
+    args = parser.parse_args()
+
+    # set in the environment so worker processes use the same parser
+    if args.parser:
+        environ[PARSER_ENV] = args.parser
+    if args.incremental and (args.split_volumes or args.merge):
+        parser.error('--incremental cannot be combined with --split-volumes or --merge')
+
     t0 = time()
-    print('Saving files metadata...', end=' ', flush=True)
-    # create the output filename
-    ext_index = basename(argv[1]).rfind('.')
-    if ext_index > -1:
-        file_name = basename(argv[1])[:ext_index] + '.out'
+    if args.incremental:
+        print(f'Converting {len(args.files)} file(s) incrementally...', flush=True)
+        for file_path in args.files:
+            out_path = get_output_name(file_path, compression=args.compress)
+            converted, total = convert_incremental(file_path, out_path, args.jobs, args.compress)
+            print(f'{file_path}: converted {converted} of {total} volume(s)', flush=True)
+    elif len(args.files) == 1 and not (args.jobs or args.split_volumes or args.merge):
+        print(f'Converting {args.files[0]}...', end=' ', flush=True)
+        convert_file(args.files[0], get_output_name(args.files[0], compression=args.compress))
     else:
-        file_name += argv[1] + '.out'
-    with open(file_name, 'w') as file:
-        for volume in volumes:
-            save_metadata(volume, file)
+        print(f'Converting {len(args.files)} file(s)...', end=' ', flush=True)
+        with stage('convert_batch', bytes=sum(getsize(f) for f in args.files), files=len(args.files)):
+            shards = convert_batch(args.files, args.jobs, args.split_volumes, args.compress)
+        if args.merge:
+            merge_shards(shards, args.merge)
 
     print(f"completed in {round(time() - t0, 4)} seconds.")
 
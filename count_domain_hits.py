@@ -1,78 +1,139 @@
 import csv
-from sys import argv
-import re
-from os.path import join, basename, isfile, isdir
-from os import listdir
-from time import time
+from os.path import basename, getsize
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from json import dumps
+import argparse
+from url_index import UrlIndex, INDEX_FILE
+from heavy_hitters import SpaceSaving, top_items
+from instrument import stage
 
-PATTERN = 'http[s]{,1}://(.*)/'
-IP_PATTERN = '[0-9]{1,3}\\.[0-9]{1,3}\\.[0-9]{1,3}\\.[0-9]{1,3}'
-URLS_HOME = '/home/jp/Documents/Programming/Java/spring/projects/ws-cybersecurity-audit/vapt-audit-files-loader/res/urls/'
+SCHEMES = ('http', 'https')
+TOP_K = 50
 
-urls = {}
-# load urls
-def load_urls(file_path: str, urls: dict):
-    category = basename(file_path)
-    for file in listdir(file_path):
-        full_path = join(file_path, file)
-        if isdir(full_path):
-            load_urls(full_path, urls)
-        else:
-            with open(full_path, 'r') as text_file:
-                for line in text_file:
-                    urls[line.strip().lower()] = category
-# t0 = time()
-# print('Loading urls... ', end='', flush=True)
-# load_urls(URLS_HOME, urls)
-# print(f'completed in {round(time() - t0, 4)}')
+def get_host(url: str):
+    # host of an http(s) url, lowercase and without userinfo, port or a leading 'www.',
+    # or None. IPv6 hosts keep their brackets.
+    start = url.find('://')
+    if start < 0 or url[:start].strip().lower() not in SCHEMES:
+        return None
+    start += 3
+    end = len(url)
+    for c in '/?#':
+        i = url.find(c, start, end)
+        if i > -1:
+            end = i
+    authority = url[start:end]
+    at = authority.rfind('@')
+    if at > -1:
+        authority = authority[at + 1:]
+    if authority.startswith('['):
+        close = authority.find(']')
+        host = authority[:close + 1] if close > -1 else authority
+    else:
+        colon = authority.find(':')
+        host = authority[:colon] if colon > -1 else authority
+    host = host.lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host or None
 
-# load domains
-domains = defaultdict(int)
-with open(argv[1], 'r') as file:
-    reader = csv.reader(file)
+def iter_hosts(file_path: str):
+    # host of each url in the second column of a browser history export
+    with open(file_path, 'r') as file:
+        reader = csv.reader(file)
+        for row in reader:
+            host = get_host(row[1])
+            if host:
+                yield host
 
-    for row in reader:
-        texts = re.findall(PATTERN, row[1])
-        if texts:
-            index = texts[0].find('/')
-            text = texts[0]
-            if index > -1:
-                text = text[:index]
-            if text.startswith('www.'):
-                text = text[4:]
-            # if re.match(IP_PATTERN, text):
-            #     print(text)
-            domains[text] += 1
+def count_domains(file_path: str, capacity: int=None):
+    # exact hits per host, or a SpaceSaving summary of at most capacity hosts
+    if capacity:
+        domains = SpaceSaving(capacity)
+        domains.update(iter_hosts(file_path))
+        return domains
+    domains = defaultdict(int)
+    for host in iter_hosts(file_path):
+        domains[host] += 1
+    return dict(domains)
 
-    # print(domains)
-# ctr = 0
-# categories = defaultdict(int)
-# for domain in domains:
-#     cat = urls.get(domain, None)
-#     if cat:
-#         ctr += 1
-#         print(f"{domain}:{domains[domain]} -> {cat}")
-#         categories[cat] += 1
-print(f"{len(domains)}")
-# print(dumps(categories, indent=3))
+def merge_counts(results: list):
+    if isinstance(results[0], SpaceSaving):
+        merged = results[0]
+        for result in results[1:]:
+            merged.merge(result)
+        return merged
+    merged = defaultdict(int)
+    for result in results:
+        for host, count in result.items():
+            merged[host] += count
+    return dict(merged)
 
-domains = [(k, v) for k, v in domains.items()]
-domains.sort(key=lambda i: i[1], reverse=True)
+def get_output_name(file_path: str):
+    filename = basename(file_path)
+    i = filename.rfind('.')
+    if len(filename) - i > 5:
+        filename += '-top-sites.txt'
+    else:
+        filename = filename[:i] + '-top-sites.txt'
+    return filename
 
-filename = basename(argv[1])
-i = filename.rfind('.')
-if len(filename) - i > 5:
-    filename += '-top-sites.txt'
-else:
-    filename = filename[:i] + '-top-sites.txt'
+def save_top_sites(domains: dict, out_path: str, k: int=TOP_K):
+    with open(out_path, 'w') as file:
+        ctr = 0
+        for d, c in top_items(domains, k):
+            file.write(f"{d}|{c}|\n")
+            print(f"{d}|{c}|")
+            ctr += 1
+        print(ctr)
 
-with open(filename, 'w') as file:
-    ctr = 0
-    while ctr < 50:
-        d, c = domains[ctr]
-        file.write(f"{d}|{c}|\n")
-        print(f"{d}|{c}|")
-        ctr += 1
-    print(ctr)
+def count_files(file_paths: list, jobs: int=1, capacity: int=None):
+    # host counts of each file, in the order of file_paths
+    if jobs > 1 and len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(file_paths))) as pool:
+            return list(pool.map(partial(count_domains, capacity=capacity), file_paths))
+    return [count_domains(file_path, capacity) for file_path in file_paths]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count the hits per site in browser history exports.')
+    parser.add_argument('files', nargs='+', help='browser history CSV exports')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of files to count in parallel')
+    parser.add_argument('-c', '--categories', nargs='?', const=INDEX_FILE, metavar='INDEX',
+                        help=f'categorise the sites with a url index built by url_index.py (default {INDEX_FILE})')
+    parser.add_argument('-k', '--top', type=int, default=TOP_K, help='number of top sites to write')
+    parser.add_argument('-s', '--sketch', type=int, metavar='CAPACITY',
+                        help='count at most CAPACITY sites per file with a Space-Saving summary; '
+                             'counts of the top sites are then upper bounds')
+    parser.add_argument('-m', '--merge', metavar='OUT', help='write the top sites of all files combined to OUT')
+    args = parser.parse_args()
+
+    with stage('count', bytes=sum(getsize(f) for f in args.files), files=len(args.files)):
+        results = count_files(args.files, args.jobs, args.sketch)
+    if args.merge:
+        with stage('merge'):
+            outputs = [(args.merge, merge_counts(results))]
+    else:
+        outputs = [(get_output_name(f), r) for f, r in zip(args.files, results)]
+
+    index = UrlIndex(args.categories) if args.categories else None
+    for out_path, domains in outputs:
+        if isinstance(domains, SpaceSaving):
+            domains = domains.counts
+        if index is not None:
+            categories = defaultdict(int)
+            for domain in domains:
+                cat = index.category(domain)
+                if cat:
+                    print(f"{domain}:{domains[domain]} -> {cat}")
+                    categories[cat] += 1
+        print(f"{len(domains)}")
+        if index is not None:
+            print(dumps(categories, indent=3))
+
+        with stage('write', file=out_path):
+            save_top_sites(domains, out_path, args.top)
+    if index is not None:
+        index.close()
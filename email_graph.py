@@ -0,0 +1,226 @@
+from array import array
+from csv import reader
+from xml.sax.saxutils import escape
+import numpy as np
+
+# Undirected, weighted email graph over integer node ids. Addresses are interned to ids
+# in first-seen order; edges are kept as COO arrays (src <= dst, weight) with one entry
+# per pair of addresses, whose weight is the number of messages between them. New
+# messages are buffered as id pairs and combined into the arrays every PENDING_EDGES
+# pairs, so graphs from several exports can be built up, saved and merged incrementally.
+# Graphs too large to draw can be pruned or aggregated into smaller graphs and exported
+# as an edge list or GraphML.
+
+PENDING_EDGES = 1 << 22
+
+def parse_addresses(text: str):
+    return [r.lower().strip() for r in text.strip().lower().split(';') if r.strip()]
+
+class EmailGraph:
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.src = np.zeros(0, dtype=np.int32)
+        self.dst = np.zeros(0, dtype=np.int32)
+        self.weight = np.zeros(0, dtype=np.int64)
+        self._pending_src = array('q')
+        self._pending_dst = array('q')
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name: str):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def add_message(self, sender: str, receivers: list):
+        s = self.intern(sender)
+        for receiver in receivers:
+            self._pending_src.append(s)
+            self._pending_dst.append(self.intern(receiver))
+        if len(self._pending_src) >= PENDING_EDGES:
+            self.compact()
+
+    def add_csv(self, file_path: str):
+        # email export with the sender in the second column and ';' separated receivers
+        # in the third, after a header row
+        with open(file_path, 'r') as file:
+            r = reader(file)
+            next(r, None)
+            for row in r:
+                receivers = parse_addresses(row[2])
+                if receivers:
+                    self.add_message(row[1].strip().lower(), receivers)
+
+    def _combine(self, src: np.ndarray, dst: np.ndarray, weight: np.ndarray):
+        lo = np.minimum(src, dst).astype(np.int64)
+        hi = np.maximum(src, dst).astype(np.int64)
+        keys = np.concatenate([(self.src.astype(np.int64) << 32) | self.dst, (lo << 32) | hi])
+        weights = np.concatenate([self.weight, np.asarray(weight, dtype=np.int64)])
+        keys, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=weights, minlength=len(keys)).astype(np.int64)
+        self.src = (keys >> 32).astype(np.int32)
+        self.dst = (keys & 0xffffffff).astype(np.int32)
+        self.weight = sums
+
+    def compact(self):
+        if self._pending_src:
+            src = np.frombuffer(self._pending_src, dtype=np.int64)
+            dst = np.frombuffer(self._pending_dst, dtype=np.int64)
+            self._combine(src, dst, np.ones(len(src), dtype=np.int64))
+            self._pending_src = array('q')
+            self._pending_dst = array('q')
+
+    def merge(self, other: 'EmailGraph'):
+        other.compact()
+        mapping = np.array([self.intern(name) for name in other.names], dtype=np.int64)
+        if len(other.src):
+            self.compact()
+            self._combine(mapping[other.src], mapping[other.dst], other.weight)
+
+    def edges(self):
+        # (src, dst, weight) arrays with src <= dst, sorted by (src, dst)
+        self.compact()
+        return self.src, self.dst, self.weight
+
+    def csr(self):
+        # symmetric adjacency as (indptr, indices, weights); a self loop is listed once
+        src, dst, weight = self.edges()
+        loops = src == dst
+        rows = np.concatenate([src, dst[~loops]])
+        cols = np.concatenate([dst, src[~loops]])
+        weights = np.concatenate([weight, weight[~loops]])
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self)), out=indptr[1:])
+        return indptr, cols[order], weights[order]
+
+    def degrees(self):
+        return np.diff(self.csr()[0])
+
+    def summary(self):
+        src, dst, weight = self.edges()
+        degrees = self.degrees()
+        stats = {
+            'nodes': len(self),
+            'edges': len(src),
+            'messages': int(weight.sum()),
+            'isolated': int((degrees == 0).sum()),
+        }
+        if len(self):
+            top = int(degrees.argmax())
+            stats['max_degree'] = int(degrees[top])
+            stats['max_degree_node'] = self.names[top]
+        if len(weight):
+            heavy = int(weight.argmax())
+            stats['max_weight'] = int(weight[heavy])
+            stats['max_weight_edge'] = [self.names[src[heavy]], self.names[dst[heavy]]]
+        return stats
+
+    def select(self, keep: np.ndarray):
+        # graph of the edges where keep is True, without the nodes that are left with none
+        src, dst, weight = self.edges()
+        src, dst = src[keep], dst[keep]
+        nodes = np.unique(np.concatenate([src, dst]))
+        graph = EmailGraph()
+        graph.names = [self.names[i] for i in nodes.tolist()]
+        graph.ids = {name: i for i, name in enumerate(graph.names)}
+        # nodes is sorted, so renumbering keeps src <= dst and the edge order
+        graph.src = np.searchsorted(nodes, src).astype(np.int32)
+        graph.dst = np.searchsorted(nodes, dst).astype(np.int32)
+        graph.weight = weight[keep]
+        return graph
+
+    def top_k_edges(self, k: int):
+        # mask of the edges that are among the k heaviest of either of their nodes, ties
+        # going to the earlier edge
+        src, dst, weight = self.edges()
+        loops = src == dst
+        edge_ids = np.arange(len(src))
+        rows = np.concatenate([src, dst[~loops]])
+        ids = np.concatenate([edge_ids, edge_ids[~loops]])
+        order = np.lexsort((ids, -weight[ids], rows))
+        rows = rows[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows, 'left')
+        keep = np.zeros(len(src), dtype=bool)
+        keep[ids[order][rank < k]] = True
+        return keep
+
+    def prune(self, min_weight: int=None, top_k: int=None, min_degree: int=None):
+        # edges lighter than min_weight are dropped first, then edges outside the top k
+        # of both their nodes, then nodes with fewer than min_degree neighbours
+        graph = self
+        if min_weight is not None:
+            graph = graph.select(graph.edges()[2] >= min_weight)
+        if top_k is not None:
+            graph = graph.select(graph.top_k_edges(top_k))
+        if min_degree is not None:
+            src, dst, _ = graph.edges()
+            degrees = graph.degrees()
+            graph = graph.select((degrees[src] >= min_degree) & (degrees[dst] >= min_degree))
+        return graph
+
+    def aggregate(self, key):
+        # graph of the groups key(name) of the nodes, e.g. their email domains. Messages
+        # within a group become a self loop.
+        graph = EmailGraph()
+        mapping = np.array([graph.intern(key(name)) for name in self.names], dtype=np.int64)
+        src, dst, weight = self.edges()
+        if len(src):
+            graph._combine(mapping[src], mapping[dst], weight)
+        return graph
+
+    def save_edge_list(self, file_path: str):
+        src, dst, weight = self.edges()
+        names = self.names
+        with open(file_path, 'w') as file:
+            for s, d, w in zip(src.tolist(), dst.tolist(), weight.tolist()):
+                file.write(f"{names[s]}|{names[d]}|{w}\n")
+
+    def save_graphml(self, file_path: str, style=None):
+        # style(name) returns a dict of node attributes; only 'color' is written
+        src, dst, weight = self.edges()
+        with open(file_path, 'w', encoding='utf-8') as file:
+            file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                       '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                       '  <key id="label" for="node" attr.name="label" attr.type="string"/>\n'
+                       '  <key id="color" for="node" attr.name="color" attr.type="string"/>\n'
+                       '  <key id="weight" for="edge" attr.name="weight" attr.type="long"/>\n'
+                       '  <graph edgedefault="undirected">\n')
+            for i, name in enumerate(self.names):
+                color = (style(name) if style else {}).get('color')
+                color = f'<data key="color">{escape(color)}</data>' if color else ''
+                file.write(f'    <node id="n{i}"><data key="label">{escape(name)}</data>{color}</node>\n')
+            for s, d, w in zip(src.tolist(), dst.tolist(), weight.tolist()):
+                file.write(f'    <edge source="n{s}" target="n{d}"><data key="weight">{w}</data></edge>\n')
+            file.write('  </graph>\n</graphml>\n')
+
+    def save(self, file_path: str):
+        # names are stored as one utf-8 blob with the byte offset of each name, like the
+        # paths of the columnar cache, rather than as a fixed width string array
+        src, dst, weight = self.edges()
+        encoded = [name.encode('utf-8') for name in self.names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        del encoded
+        with open(file_path, 'wb') as file:
+            np.savez(file, names=blob, name_offsets=offsets, src=src, dst=dst, weight=weight)
+
+    @classmethod
+    def load(cls, file_path: str):
+        graph = cls()
+        with np.load(file_path) as data:
+            if 'name_offsets' not in data:
+                raise ValueError(f'{file_path} was saved in an older format, rebuild the graph')
+            blob = data['names'].tobytes()
+            offsets = data['name_offsets'].tolist()
+            graph.names = [blob[s:e].decode('utf-8') for s, e in zip(offsets, offsets[1:])]
+            graph.src = data['src']
+            graph.dst = data['dst']
+            graph.weight = data['weight']
+        graph.ids = {name: i for i, name in enumerate(graph.names)}
+        return graph
@@ -1,39 +1,75 @@
 from csv import reader
-import matplotlib.pyplot as plt
 from collections import defaultdict
-from sys import argv
 from math import log
-from os.path import basename
-from whois import whois
-
-domains = defaultdict(int)
-with open(argv[1], 'r') as file:
-    r = reader(file)
-    for row in r:
-        index = row[2].find('@')
-        if index > -1:
-            domains[row[2][index + 1:]] += 1
-
-names = []
-counts = []
-for k, v in domains.items():
-    w = whois(k)
-    if w['domain_name']:
-        print(f'domain: {k}, count: {v}')
-    # if v > 1:
-        names.append(k)
-        counts.append(log(1 + v))
-
-plt.title('Counts of Email addresses by Domain')
-plt.barh(names, counts)
-plt.yticks(fontsize=8)
-plt.ylabel('Domain')
-plt.xlabel('Natural logarithm of 1+count')
-plt.grid(axis='y')
-plt.tight_layout()
-
-filename = basename(argv[1])
-dot_index = filename.rfind('.')
-if dot_index > -1 and len(filename) - dot_index <= 5:
-    filename = filename[:dot_index].replace('.', '_') + '-domain-counts'
-plt.savefig(filename)
+from os.path import basename, getsize
+import argparse
+from whois_cache import WhoisCache, lookup_domains, load_resolver, CACHE_FILE, TTL, NEGATIVE_TTL
+from instrument import stage
+
+def get_domain(address: str):
+    # the part after the '@' of an email address, or None
+    index = address.find('@')
+    if index > -1:
+        return address[index + 1:]
+    return None
+
+def count_domains(file_path: str):
+    domains = defaultdict(int)
+    with open(file_path, 'r') as file:
+        r = reader(file)
+        for row in r:
+            domain = get_domain(row[2])
+            if domain is not None:
+                domains[domain] += 1
+    return domains
+
+def get_output_name(file_path: str):
+    filename = basename(file_path)
+    dot_index = filename.rfind('.')
+    if dot_index > -1 and len(filename) - dot_index <= 5:
+        filename = filename[:dot_index].replace('.', '_') + '-domain-counts'
+    return filename
+
+def save_domain_graph(names: list, counts: list, filename: str):
+    import matplotlib.pyplot as plt
+
+    plt.title('Counts of Email addresses by Domain')
+    plt.barh(names, counts)
+    plt.yticks(fontsize=8)
+    plt.ylabel('Domain')
+    plt.xlabel('Natural logarithm of 1+count')
+    plt.grid(axis='y')
+    plt.tight_layout()
+    plt.savefig(filename)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Graph the counts of email addresses by registered domain.')
+    parser.add_argument('file')
+    parser.add_argument('--cache', default=CACHE_FILE, help='WHOIS cache file')
+    parser.add_argument('--ttl', type=float, default=TTL, help='seconds to keep a registered domain')
+    parser.add_argument('--negative-ttl', type=float, default=NEGATIVE_TTL,
+                        help='seconds to keep a domain without a WHOIS record')
+    parser.add_argument('-j', '--jobs', type=int, help='number of concurrent WHOIS lookups')
+    parser.add_argument('--resolver', metavar='MODULE:FUNCTION',
+                        help='function used instead of whois to look up a domain')
+    args = parser.parse_args()
+
+    with stage('count', file=args.file, bytes=getsize(args.file)) as s:
+        domains = count_domains(args.file)
+        s.rows = len(domains)
+    resolver = load_resolver(args.resolver) if args.resolver else None
+    with stage('lookup', rows=len(domains)), WhoisCache(args.cache, args.ttl, args.negative_ttl) as cache:
+        registered = lookup_domains(list(domains), cache, resolver, args.jobs)
+
+    names = []
+    counts = []
+    for k, v in domains.items():
+        if registered[k]:
+            print(f'domain: {k}, count: {v}')
+        # if v > 1:
+            names.append(k)
+            counts.append(log(1 + v))
+
+    with stage('render', rows=len(names)):
+        save_domain_graph(names, counts, get_output_name(args.file))
@@ -1,52 +1,67 @@
-import csv
-from sys import argv
-from collections import defaultdict
-import networkx as nx
-import matplotlib.pyplot as plt
-from pyvis.network import Network
+from os.path import exists, getsize
 from json import dumps
+import argparse
+from email_graph import EmailGraph
+from graph_email_domains import get_domain
+from node_rules import NodeClassifier, load_rules, RULES_FILE
+from instrument import stage
 
-emails = defaultdict(lambda: defaultdict(int))
-with open(argv[1], 'r') as file:
-    reader = csv.reader(file)
-    for i, row in enumerate(reader):
-        if i == 0:
-            continue
-
-        sender = row[1].strip().lower()
-        receivers = row[2].strip().lower()
-        if receivers:
-            receivers = [r.lower().strip() for r in receivers.split(';') if r.strip()]
-            for receiver in receivers:
-                emails[sender][receiver] += 1
-                emails[receiver][sender] += 1
-
-print(dumps(emails, indent=3))
-
-names = set()
-g = Network('100%', '100%') #nx.Graph()
-for sender, receivers in emails.items():
-    for receiver, weight in receivers.items():
-        names.add(sender)
-        if sender in ['shepherd, denise', 'gegg, emily']:
-            g.add_node(sender, label=sender, color='green')
-        elif 'escada' in sender:
-            g.add_node(sender, label=receiver, color='orange')
-        elif '@' in sender:
-            g.add_node(sender, label=receiver, color='gray')
-        else:
-            g.add_node(sender, label=sender)
-        if receiver not in names:
-            if receiver in ['shepherd, denise', 'gegg, emily']:
-                g.add_node(receiver, label=receiver, color='green')
-            elif 'escada' in receiver:
-                g.add_node(receiver, label=receiver, color='orange')
-            elif '@' in receiver:
-                g.add_node(receiver, label=receiver, color='gray')
-            else:
-                g.add_node(receiver, label=receiver)
-            g.add_edge(sender, receiver, value=weight)
-
-# nx.draw(g, with_labels=True, node_size=100, linewidths=10)
-# plt.show()
-g.show('network.html')
+def save_network(graph: EmailGraph, file_path: str, style):
+    from pyvis.network import Network
+
+    src, dst, weight = graph.edges()
+    g = Network('100%', '100%')
+    for name in graph.names:
+        g.add_node(name, label=name, **style(name))
+    for s, r, w in zip(src.tolist(), dst.tolist(), weight.tolist()):
+        g.add_edge(graph.names[s], graph.names[r], value=w)
+    g.show(file_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the network of who emails whom from email exports.')
+    parser.add_argument('files', nargs='*', help='email CSV exports')
+    parser.add_argument('-g', '--graph', metavar='NPZ',
+                        help='saved graph to merge the exports into, and to save the result to')
+    parser.add_argument('--html', default='network.html', help='interactive network page to write')
+    parser.add_argument('--no-html', action='store_true', help='only print the summary')
+    parser.add_argument('--domains', action='store_true', help='combine the addresses of each email domain')
+    parser.add_argument('--min-weight', type=int, help='drop edges with fewer messages')
+    parser.add_argument('--top-k', type=int, help="keep only the k heaviest edges of each node")
+    parser.add_argument('--min-degree', type=int, help='drop nodes with fewer neighbours')
+    parser.add_argument('--edge-list', metavar='FILE', help="write the edges as 'node|node|weight' lines")
+    parser.add_argument('--graphml', metavar='FILE', help='write the graph as GraphML')
+    parser.add_argument('--rules', metavar='FILE',
+                        help=f'node colouring rules, by default {RULES_FILE} if it exists or the built-in rules')
+    args = parser.parse_args()
+
+    rules_file = args.rules or (RULES_FILE if exists(RULES_FILE) else None)
+    classifier = NodeClassifier(load_rules(rules_file) if rules_file else None)
+
+    graph = EmailGraph.load(args.graph) if args.graph and exists(args.graph) else EmailGraph()
+    for file_path in args.files:
+        with stage('parse', file=file_path, bytes=getsize(file_path)):
+            graph.add_csv(file_path)
+    if args.graph:
+        with stage('save'):
+            graph.save(args.graph)
+
+    print(dumps(graph.summary(), indent=3))
+
+    # the network that is drawn and exported
+    view = graph
+    with stage('prune') as s:
+        if args.domains:
+            view = view.aggregate(lambda name: get_domain(name) or name)
+        view = view.prune(args.min_weight, args.top_k, args.min_degree)
+        s.rows = len(view.edges()[0])
+    if view is not graph:
+        print(f"Showing {len(view)} nodes and {len(view.edges()[0])} edges")
+
+    with stage('write'):
+        if args.edge_list:
+            view.save_edge_list(args.edge_list)
+        if args.graphml:
+            view.save_graphml(args.graphml, classifier.style)
+        if not args.no_html:
+            save_network(view, args.html, classifier.style)
@@ -0,0 +1,75 @@
+from heapq import heappush, heappop, heapify, nlargest
+from operator import itemgetter
+
+# Top-k counting in bounded memory with the Space-Saving algorithm. At most capacity
+# items are counted; a new item takes the place of the item with the smallest count and
+# starts from that count, which is kept as the item's error. Every item that occurs more
+# than n / capacity times in a stream of n items is kept, and its count is at most its
+# error above the true count. Summaries of separate streams can be merged.
+
+def top_items(counts: dict, k: int):
+    # the k (item, count) pairs with the highest counts, ties in the order of counts
+    return nlargest(k, counts.items(), key=itemgetter(1))
+
+class SpaceSaving:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # (count, item) for the current count of each item, plus stale entries of
+        # earlier counts that are skipped when popped
+        self._heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def floor(self):
+        # the count a new item would start from
+        if len(self.counts) < self.capacity:
+            return 0
+        while True:
+            count, item = self._heap[0]
+            if self.counts.get(item) == count:
+                return count
+            heappop(self._heap)
+
+    def add(self, item, count: int=1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+        elif len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = 0
+        else:
+            floor = self.floor()
+            _, victim = heappop(self._heap)
+            del counts[victim]
+            del self.errors[victim]
+            counts[item] = floor + count
+            self.errors[item] = floor
+        heappush(self._heap, (counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild()
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def _rebuild(self):
+        self._heap = [(count, item) for item, count in self.counts.items()]
+        heapify(self._heap)
+
+    def merge(self, other: 'SpaceSaving'):
+        # an item missing from a full summary may have occurred up to its floor times
+        floor, other_floor = self.floor(), other.floor()
+        items = list(self.counts) + [i for i in other.counts if i not in self.counts]
+        merged = [(i, self.counts.get(i, floor) + other.counts.get(i, other_floor),
+                   self.errors.get(i, floor) + other.errors.get(i, other_floor)) for i in items]
+        merged = nlargest(self.capacity, merged, key=itemgetter(1))
+        self.counts = {i: count for i, count, _ in merged}
+        self.errors = {i: error for i, _, error in merged}
+        self._rebuild()
+        return self
+
+    def top(self, k: int):
+        return top_items(self.counts, k)
@@ -0,0 +1,85 @@
+from datetime import datetime
+import numpy as np
+
+# Vectorized bin counts over int64 epoch-second arrays, shared by the graph scripts.
+
+SECS_IN_DAY = 24 * 3600
+SECS_IN_HOUR = 3600
+EPOCH = datetime(1970, 1, 1)
+EPOCH_WEEKDAY = 3   # 1970-01-01 was a Thursday, Monday is 0
+
+def utc_offsets(epochs: np.ndarray, tz):
+    # offset in seconds from UTC of tz at each instant. pytz zones with DST keep a table of
+    # UTC transition times, which is searched the same way pytz's fromutc() does; any other
+    # zone is treated as a fixed offset.
+    transitions = getattr(tz, '_utc_transition_times', None)
+    if not transitions:
+        offset = tz.utcoffset(EPOCH)
+        return np.full(len(epochs), int(offset.total_seconds()) if offset else 0, dtype=np.int64)
+
+    starts = np.array([int((t - EPOCH).total_seconds()) for t in transitions], dtype=np.int64)
+    offsets = np.array([int(info[0].total_seconds()) for info in tz._transition_info], dtype=np.int64)
+    index = np.maximum(np.searchsorted(starts, epochs, 'right') - 1, 0)
+    return offsets[index]
+
+def to_local(epochs: np.ndarray, tz):
+    # seconds since the epoch of the local wall clock time in tz
+    epochs = np.asarray(epochs, dtype=np.int64)
+    return epochs + utc_offsets(epochs, tz)
+
+def weekday(local: np.ndarray):
+    return (local // SECS_IN_DAY + EPOCH_WEEKDAY) % 7
+
+def year(local: np.ndarray):
+    return local.astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+def linear_bins(values: np.ndarray, start: int, divisor: int, length: int):
+    # counts of (value - start) // divisor, ignoring values that fall outside [0, length)
+    index = (np.asarray(values, dtype=np.int64) - start) // divisor
+    index = index[(index >= 0) & (index < length)]
+    return np.bincount(index, minlength=length)
+
+def scaled_bins(fractions: np.ndarray, xres: int):
+    # counts of round((xres - 1) * fraction) for fractions in [0, 1]
+    index = np.rint((xres - 1) * fractions).astype(np.int64)
+    return np.bincount(index, minlength=xres)
+
+def inode_bins(inodes: np.ndarray, divisor: int, length: int):
+    return np.bincount(np.asarray(inodes, dtype=np.int64) // divisor, minlength=length)
+
+def depth_bins(depths: np.ndarray):
+    # counts of depths 1..max(depths)
+    return np.bincount(depths)[1:]
+
+def log_size_bins(sizes: np.ndarray, xres: int):
+    # counts of the natural log of 1+size scaled to xres bins, and the largest log size
+    log_sizes = np.log(1.0 + np.asarray(sizes, dtype=np.int64))
+    max_size = log_sizes.max()
+    return scaled_bins(log_sizes / max_size, xres), max_size
+
+class MacTimes:
+    # creation, modification and access times of the same files as epoch seconds, both
+    # absolute and shifted to the local time of tz. Every method returns the counts in
+    # (creation, modification, access) order.
+    def __init__(self, ctimes: np.ndarray, mtimes: np.ndarray, atimes: np.ndarray, tz):
+        self.utc = tuple(np.asarray(t, dtype=np.int64) for t in (ctimes, mtimes, atimes))
+        self.local = tuple(to_local(t, tz) for t in self.utc)
+
+    def __len__(self):
+        return len(self.utc[0])
+
+    def max_atime(self):
+        return int(self.utc[2].max())
+
+    def all_time(self, start: int, divisor: int, length: int):
+        return tuple(linear_bins(t, start, divisor, length) for t in self.utc)
+
+    def weekly(self, xres: int):
+        return tuple(scaled_bins((weekday(t) + ((t % SECS_IN_DAY) / SECS_IN_DAY)) / 7, xres)
+                     for t in self.local)
+
+    def daily(self, xres: int):
+        return tuple(scaled_bins((t % SECS_IN_DAY) / SECS_IN_DAY, xres) for t in self.local)
+
+    def hourly(self, xres: int):
+        return tuple(scaled_bins((t % SECS_IN_HOUR) / SECS_IN_HOUR, xres) for t in self.local)
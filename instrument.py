@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from json import dump
+from os import environ, getpid
+from time import perf_counter, process_time, time
+import atexit
+import sys
+
+try:
+    import resource
+except ImportError:   # not available on Windows
+    resource = None
+
+# Stage timings for the pipeline scripts. Code marks its stages with
+#     with stage('parse', bytes=size) as s:
+#         ...
+#         s.rows += n
+# and each stage records its wall and CPU time, the rows and bytes it handled and the peak
+# RSS of the process when it ended. Tracing is off unless PIPELINE_TRACE names a JSON file,
+# which the stages of the process are written to when it exits. PIPELINE_PROFILE=1 also
+# runs cProfile over the whole process, saving the stats to <trace>.prof and the top
+# functions in the trace. Stages in pool workers are not recorded.
+
+TRACE_ENV = 'PIPELINE_TRACE'
+PROFILE_ENV = 'PIPELINE_PROFILE'
+PROFILE_TOP = 25
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+class Stage:
+    __slots__ = ('name', 'meta', 'rows', 'bytes')
+
+    def __init__(self, name: str, meta: dict, rows: int=0, bytes: int=0):
+        self.name = name
+        self.meta = meta
+        self.rows = rows
+        self.bytes = bytes
+
+class Tracer:
+    def __init__(self, file_path: str, profile: bool=False):
+        self.file_path = file_path
+        self.pid = getpid()
+        self.stages = []
+        self._depth = 0
+        self._started = time()
+        self._wall = perf_counter()
+        self._cpu = process_time()
+        self.profiler = None
+        if profile:
+            from cProfile import Profile
+            self.profiler = Profile()
+            self.profiler.enable()
+        atexit.register(self.write)
+
+    @contextmanager
+    def stage(self, name: str, rows: int=0, bytes: int=0, **meta):
+        s = Stage(name, meta, rows, bytes)
+        depth = self._depth
+        self._depth += 1
+        wall, cpu = perf_counter(), process_time()
+        try:
+            yield s
+        finally:
+            self._depth -= 1
+            seconds = perf_counter() - wall
+            self.stages.append({
+                'name': name,
+                'depth': depth,
+                'start': round(wall - self._wall, 6),
+                'seconds': round(seconds, 6),
+                'cpu_seconds': round(process_time() - cpu, 6),
+                'rows': s.rows,
+                'bytes': s.bytes,
+                'rows_per_second': round(s.rows / seconds, 1) if s.rows and seconds else None,
+                'peak_rss_kb': peak_rss_kb(),
+                **s.meta,
+            })
+
+    def profile_summary(self):
+        from pstats import Stats
+        self.profiler.disable()
+        self.profiler.dump_stats(self.file_path + '.prof')
+        stats = Stats(self.profiler)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+        return [{'function': f'{file}:{line}({func})', 'calls': nc, 'tottime': round(tt, 6), 'cumtime': round(ct, 6)}
+                for (file, line, func), (_, nc, tt, ct, _) in top]
+
+    def write(self):
+        # forked workers inherit the tracer but must not overwrite the trace
+        if getpid() != self.pid:
+            return
+        trace = {
+            'argv': sys.argv,
+            'started': self._started,
+            'seconds': round(perf_counter() - self._wall, 6),
+            'cpu_seconds': round(process_time() - self._cpu, 6),
+            'peak_rss_kb': peak_rss_kb(),
+            'stages': sorted(self.stages, key=lambda s: s['start']),
+        }
+        if self.profiler is not None:
+            trace['profile'] = self.profile_summary()
+        with open(self.file_path, 'w') as file:
+            dump(trace, file, indent=3)
+
+_tracer = None
+
+def get_tracer():
+    # the tracer of this process, or None if tracing is off
+    global _tracer
+    if _tracer is None and environ.get(TRACE_ENV):
+        _tracer = Tracer(environ[TRACE_ENV], environ.get(PROFILE_ENV, '0') not in ('', '0'))
+    return _tracer
+
+@contextmanager
+def stage(name: str, rows: int=0, bytes: int=0, **meta):
+    tracer = get_tracer()
+    if tracer is None:
+        yield Stage(name, meta, rows, bytes)
+    else:
+        with tracer.stage(name, rows, bytes, **meta) as s:
+            yield s
@@ -1,96 +1,66 @@
-from datetime import datetime, timedelta
-from time import time
 from sys import argv
-from pytz import UTC
-from collections import defaultdict
-from math import ceil, log, e
-import matplotlib.pyplot as plt
-from os import mkdir
-from os.path import exists, join, basename
+from math import log
+from os.path import join
+from compressed import get_name
+from reports import RangeReport, run_reports
+from render import save_line_figure
+from pathlist import iter_sorted_paths
 
 X_RES = 10
 
-# load the dir and extensions categories
-EXTENSIONS = {}
-with open('extensions.txt', 'r') as file:
-    for line in file:
-        line = line.split(' ')
-        EXTENSIONS[line[0].strip()] = line[1].strip()
-
-def make_graph(category, x_data, y_data, min_size, max_size, base_dir):
-
-    plt.title(f'Depth of Files by {category}')
-    plt.ylabel(f'Natural logarithm of 1+count')
-    plt.xlabel(f'Depth')
-
+def make_graph(category, x_data, y_data, min_size, max_size, base_dir, renderer):
     labels = []
+    lines = []
     for k, v in y_data.items():
-        plt.plot(x_data, [log(1 + i) for i in v])
+        lines.append((x_data, [log(1 + i) for i in v], {}))
         labels.append(k)
 
-    plt.legend(labels, loc='upper left', prop={'size': 7}, bbox_to_anchor=(1.02, 1.05))
-    plt.savefig(join(base_dir, f'{category}-of-files-sizes-{min_size}-{max_size}.png'), bbox_inches='tight')
-    plt.close()
+    renderer.submit(save_line_figure, join(base_dir, f'{category}-of-files-sizes-{min_size}-{max_size}.png'), lines,
+                    title=f'Depth of Files by {category}', ylabel='Natural logarithm of 1+count',
+                    xlabel='Depth', legend=True, legend_labels=labels,
+                    legend_kwargs={'loc': 'upper left', 'prop': {'size': 7}, 'bbox_to_anchor': (1.02, 1.05)},
+                    bbox_inches='tight')
 
-def create_path_list(grouped_lines, category, base_dir):
-    grouped_lines = [(k, v) for k, v in grouped_lines.items()]
-    grouped_lines.sort(key=lambda i: len(i[1]), reverse=True)
+def create_path_list(cols, grouped_rows, category, base_dir):
+    grouped_rows = [(k, v) for k, v in grouped_rows.items()]
+    grouped_rows.sort(key=lambda i: len(i[1]), reverse=True)
 
+    depths = cols['depth']
     with open(join(base_dir, f"{category}-file-list.txt"), "w") as file:
-        for cat, lines in grouped_lines:
-            file.write(f"{cat} ({len(lines)})\n")
-            lines.sort(key=lambda i: i[-1])
-            for i, line in enumerate(lines, 1):
-                file.write(f"{i: >10} | {line[-1]:>2} | {line[16]}\n")
+        for cat, rows in grouped_rows:
+            file.write(f"{cat} ({len(rows)})\n")
+            for i, (path, depth) in enumerate(iter_sorted_paths(cols, rows, depths[rows]), 1):
+                file.write(f"{i: >10} | {depth:>2} | {path}\n")
             file.write(f"{'-' * 80}\n")
 
+class DepthReport(RangeReport):
+    column = 'depth'
+
+    def __init__(self, min_depth, max_depth):
+        super().__init__()
+        self.min_depth = int(min_depth)
+        self.max_depth = int(max_depth)
+
+        # create the x-axis
+        self.x_data = [i for i in range(self.min_depth, self.max_depth + 1)]
+
+    def get_base_dir(self, file_name):
+        return f"{get_name(file_name).replace('.', '_')}-file-depths-{self.min_depth}-{self.max_depth}"
+
+    def bounds(self):
+        return self.min_depth, self.max_depth
+
+    def bins(self, depths):
+        return depths - self.min_depth
+
+    def make_graph(self, category, y_data, base_dir, renderer):
+        make_graph(category, self.x_data, y_data, self.min_depth, self.max_depth, base_dir, renderer)
+
+    def create_path_list(self, cols, grouped_rows, category, base_dir):
+        create_path_list(cols, grouped_rows, category, base_dir)
+
 def make_graphs(file_name, min_depth, max_depth):
-    min_depth = int(min_depth)
-    max_depth = int(max_depth)
-
-     # create the basedir
-    base_dir = f"{basename(file_name).replace('.', '_')}-file-depths-{min_depth}-{max_depth}"
-    if not exists(base_dir):
-        mkdir(base_dir)
-
-    # create the x-axis
-    x_data = [i for i in range(min_depth, max_depth + 1)]
-
-    topdirs = defaultdict(lambda: [0] * len(x_data))
-    botdirs = defaultdict(lambda: [0] * len(x_data))
-    extensions = defaultdict(lambda: [0] * len(x_data))
-
-    topdir_lines = defaultdict(list)
-    botdir_lines = defaultdict(list)
-    extension_lines = defaultdict(list)
-
-    # open file and read each line
-    with open(file_name, 'r') as file:
-        for line in file:
-            line = line.rstrip().split('|')
-            depth = len(line[16].split('/'))
-            if depth >= min_depth and depth <= max_depth:
-                line[7] = EXTENSIONS.get(line[7], line[7])
-                line[6] = EXTENSIONS.get(line[6], line[6])
-                line[8] = EXTENSIONS.get(line[8], line[8])
-                extensions[line[6]][depth - min_depth] += 1
-                topdirs[line[7]][depth - min_depth] += 1
-                botdirs[line[8]][depth - min_depth] += 1
-
-                line.append(depth)
-                topdir_lines[line[7]].append(line)
-                botdir_lines[line[8]].append(line)
-                extension_lines[line[6]].append(line)
-
-    for y_data, category in zip([topdirs, botdirs, extensions], ['topdirs', 'botdirs', 'extensions']):
-        make_graph(category, x_data, y_data, min_depth, max_depth, base_dir)
-
-    for category, grouped_lines in [
-        ('topdirs', topdir_lines),
-        ('botdirs', botdir_lines),
-        ('extensions', extension_lines)
-    ]:
-        create_path_list(grouped_lines, category, base_dir)
+    run_reports(file_name, [DepthReport(min_depth, max_depth)])
 
 
 if __name__ == '__main__':
@@ -1,101 +1,73 @@
-from datetime import datetime, timedelta
-from time import time
 from sys import argv
-from pytz import UTC
-from collections import defaultdict
-from math import ceil, log, e
-import matplotlib.pyplot as plt
-from os import mkdir
-from os.path import exists, join, basename
+from math import ceil, floor, log, e
+from os.path import join
+import numpy as np
+from compressed import get_name
+from reports import RangeReport, run_reports
+from render import save_line_figure
+from pathlist import iter_sorted_paths
 
 X_RES = 30
 
-# load the dir and extensions categories
-EXTENSIONS = {}
-with open('extensions.txt', 'r') as file:
-    for line in file:
-        line = line.split(' ')
-        EXTENSIONS[line[0].strip()] = line[1].strip()
-
-def make_graph(category, x_data, y_data, min_size, max_size, base_dir):
-
-    plt.title(f'Distribution of Files with size between log {min_size} to {max_size} to {category}')
-    plt.ylabel(f'Natural logarithm of 1+count')
-    plt.xlabel(f'Natural logarithm of 1+size in bytes')
-
+def make_graph(category, x_data, y_data, min_size, max_size, base_dir, renderer):
     labels = []
+    lines = []
     for k, v in y_data.items():
-        plt.plot(x_data, [log(1 + i) for i in v])
+        lines.append((x_data, [log(1 + i) for i in v], {}))
         labels.append(k)
 
-    plt.legend(labels, loc='upper left', prop={'size': 7}, bbox_to_anchor=(1.02, 1.05))
-    plt.savefig(join(base_dir, f'{category}-of-files-sizes-{min_size}-{max_size}.png'), bbox_inches='tight')
-    plt.close()
+    renderer.submit(save_line_figure, join(base_dir, f'{category}-of-files-sizes-{min_size}-{max_size}.png'), lines,
+                    title=f'Distribution of Files with size between log {min_size} to {max_size} to {category}', ylabel='Natural logarithm of 1+count',
+                    xlabel='Natural logarithm of 1+size in bytes', legend=True, legend_labels=labels,
+                    legend_kwargs={'loc': 'upper left', 'prop': {'size': 7}, 'bbox_to_anchor': (1.02, 1.05)},
+                    bbox_inches='tight')
 
-def create_path_list(grouped_lines, category, base_dir):
-    grouped_lines = [(k, v) for k, v in grouped_lines.items()]
-    grouped_lines.sort(key=lambda i: len(i[1]), reverse=True)
+def create_path_list(cols, grouped_rows, category, base_dir):
+    grouped_rows = [(k, v) for k, v in grouped_rows.items()]
+    grouped_rows.sort(key=lambda i: len(i[1]), reverse=True)
 
+    sizes = cols['size']
     with open(join(base_dir, f"{category}-file-list.txt"), "w") as file:
-        for cat, lines in grouped_lines:
-            file.write(f"{cat} ({len(lines)})\n")
-            lines.sort(key=lambda i: i[16])
-            for i, line in enumerate(lines, 1):
-                file.write(f"{i: >10} | {line[9]:>12} | {line[16]}\n")
+        for cat, rows in grouped_rows:
+            file.write(f"{cat} ({len(rows)})\n")
+            lines = iter_sorted_paths(cols, rows, values=lambda i: sizes[rows[i]].tolist())
+            for i, (path, size) in enumerate(lines, 1):
+                file.write(f"{i: >10} | {size:>12} | {path}\n")
             file.write(f"{'-' * 80}\n")
 
-def make_graphs(file_name: str, min_log, max_log):
-    min_size = (e ** float(min_log)) - 1
-    max_size = (e ** float(max_log)) - 1
+class SizeReport(RangeReport):
+    column = 'size'
 
-    # create the basedir
-    base_dir = f"{basename(file_name).replace('.', '_')}-file-sizes-{min_log}-{max_log}"
-    if not exists(base_dir):
-        mkdir(base_dir)
+    def __init__(self, min_log, max_log):
+        super().__init__()
+        self.min_log = min_log
+        self.max_log = max_log
+        self.min_size = (e ** float(min_log)) - 1
+        self.max_size = (e ** float(max_log)) - 1
 
-    # create the x-axis
-    increment = (max_size - min_size) / X_RES
-    x_data = []
-    for i in range(X_RES):
-        x_data.append(log(1 + round(min_size + (i * increment))))
+        # create the x-axis
+        self.increment = (self.max_size - self.min_size) / X_RES
+        self.x_data = []
+        for i in range(X_RES):
+            self.x_data.append(log(1 + round(self.min_size + (i * self.increment))))
 
-    topdirs = defaultdict(lambda: [0] * X_RES)
-    botdirs = defaultdict(lambda: [0] * X_RES)
-    extensions = defaultdict(lambda: [0] * X_RES)
+    def get_base_dir(self, file_name):
+        return f"{get_name(file_name).replace('.', '_')}-file-sizes-{self.min_log}-{self.max_log}"
 
-    topdir_lines = defaultdict(list)
-    botdir_lines = defaultdict(list)
-    extension_lines = defaultdict(list)
+    def bounds(self):
+        return ceil(self.min_size), floor(self.max_size)
 
-    lines = []
-    with open(file_name, 'r') as file:
-        for line in file:
-            # convert size to int and load the extension categories
-            line = line.rstrip().split('|')
-            size = int(line[9])
-            if size >= min_size and size <= max_size:
-                line[7] = EXTENSIONS.get(line[7], line[7])
-                line[6] = EXTENSIONS.get(line[6], line[6])
-                line[8] = EXTENSIONS.get(line[8], line[8])
-                line[9] = int(line[9])
-                lines.append(line)
-                topdirs[line[7]][int((line[9] - min_size) // increment)] += 1
-                botdirs[line[8]][int((line[9] - min_size) // increment)] += 1
-                extensions[line[6]][int((line[9] - min_size) // increment)] += 1
-
-                topdir_lines[line[7]].append(line)
-                botdir_lines[line[8]].append(line)
-                extension_lines[line[6]].append(line)
-
-    for y_data, category in zip([topdirs, botdirs, extensions], ['topdirs', 'botdirs', 'extensions']):
-        make_graph(category, x_data, y_data, min_log, max_log, base_dir)
-
-    for category, grouped_lines in [
-        ('topdirs', topdir_lines),
-        ('botdirs', botdir_lines),
-        ('extensions', extension_lines)
-    ]:
-        create_path_list(grouped_lines, category, base_dir)
+    def bins(self, sizes):
+        return np.minimum((sizes - self.min_size) // self.increment, X_RES - 1)
+
+    def make_graph(self, category, y_data, base_dir, renderer):
+        make_graph(category, self.x_data, y_data, self.min_log, self.max_log, base_dir, renderer)
+
+    def create_path_list(self, cols, grouped_rows, category, base_dir):
+        create_path_list(cols, grouped_rows, category, base_dir)
+
+def make_graphs(file_name: str, min_log, max_log):
+    run_reports(file_name, [SizeReport(min_log, max_log)])
 
 
 if __name__ == '__main__':
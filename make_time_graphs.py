@@ -1,39 +1,110 @@
-from datetime import datetime, timedelta
-from time import time
+from datetime import datetime
 from sys import argv
-from pytz import UTC
-from collections import defaultdict
-from math import ceil, log
-import matplotlib.pyplot as plt
+from pytz import UTC, timezone
+from math import log
 from os import mkdir
-from os.path import exists, join, basename
+from os.path import exists, join
+import numpy as np
+from columns import MISSING, count_by_category, group_rows
+from categories import get_extensions
+from histogram import to_local, weekday, year, SECS_IN_DAY
+from compressed import get_name
+from reports import run_reports
+from render import save_line_figure
+from pathlist import iter_sorted_paths
 
 X_RES = 120
 
-# load the dir and extensions categories
-EXTENSIONS = {}
-with open('extensions.txt', 'r') as file:
-    for line in file:
-        line = line.split(' ')
-        EXTENSIONS[line[0].strip()] = line[1].strip()
-
-def create_path_list(grouped_lines: dict, date_index: int, mac: str, category: str, base_dir: str):
+# .out column index -> columnar cache name
+CATEGORY_COLUMNS = {6: 'ext', 7: 'topdir', 8: 'botdir'}
+DATE_COLUMNS = {13: 'crtime', 14: 'mtime', 15: 'atime'}
+
+def format_offset(seconds: int):
+    sign = '-' if seconds < 0 else '+'
+    hours, seconds = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{sign}{hours:02}:{minutes:02}" + (f":{seconds:02}" if seconds else '')
+
+def format_dates(utc: np.ndarray, local: np.ndarray):
+    # same text as str() of the timezone aware datetime, without creating one per row
+    text = np.datetime_as_string(local.astype('datetime64[s]')).tolist()
+    offsets = (local - utc).tolist()
+    suffixes = {offset: format_offset(offset) for offset in set(offsets)}
+    return [f"{t.replace('T', ' ')}{suffixes[offset]}" for t, offset in zip(text, offsets)]
+
+class MacLines:
+    # the files with all three mac times, as arrays keyed by their .out column index:
+    # category codes at 6, 7 and 8 and mac times as UTC and local epoch seconds at 13,
+    # 14 and 15. Paths are only read from the cache when a path list is written.
+    def __init__(self, cols, rows: np.ndarray, categories: dict, utc: dict, local: dict):
+        self.cols = cols
+        self.rows = rows
+        self.categories = categories
+        self.utc = utc
+        self.local = local
+
+    @classmethod
+    def load(cls, cols, rows: np.ndarray, tz):
+        categories = {}
+        for index, name in CATEGORY_COLUMNS.items():
+            codes, labels = cols.categories(name, get_extensions())
+            categories[index] = (codes[rows], labels)
+        utc = {index: np.asarray(cols[name][rows], dtype=np.int64) for index, name in DATE_COLUMNS.items()}
+        local = {index: to_local(times, tz) for index, times in utc.items()}
+        return cls(cols, rows, categories, utc, local)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def subset(self, mask: np.ndarray):
+        return MacLines(self.cols, self.rows[mask],
+                        {i: (codes[mask], labels) for i, (codes, labels) in self.categories.items()},
+                        {i: times[mask] for i, times in self.utc.items()},
+                        {i: times[mask] for i, times in self.local.items()})
+
+    def count(self, cat_index: int, index: np.ndarray):
+        # per-bin counts and the positions of the lines of each category
+        codes, labels = self.categories[cat_index]
+        index = index.astype(np.int64)
+        return count_by_category(codes, labels, index, X_RES), group_rows(codes, labels, np.arange(len(self)))
+
+    def dates(self, date_index: int, positions: np.ndarray):
+        return format_dates(self.utc[date_index][positions], self.local[date_index][positions])
+
+def create_path_list(lines: MacLines, grouped_lines: dict, date_index: int, mac: str, category: str, base_dir: str):
     # convert to list of tuples to enable sorting
     grouped_lines = [(k, v) for k, v in grouped_lines.items()]
     grouped_lines.sort(key=lambda i: len(i[1]), reverse=True)
 
     # write to file
+    times = lines.utc[date_index]
     with open(join(base_dir, f"{category}-{mac}-file-list.txt"), 'w') as file:
-        for cat, lines in grouped_lines:
-            file.write(f"{cat} - {mac} ({len(lines)}):\n")
-            lines.sort(key=lambda i: i[date_index])
-            for i, line in enumerate(lines, 1):
-                file.write(f"{i: >10} | {line[date_index]} | {line[16]}\n")
+        for cat, positions in grouped_lines:
+            file.write(f"{cat} - {mac} ({len(positions)}):\n")
+            paths = iter_sorted_paths(lines.cols, lines.rows[positions], times[positions],
+                                      lambda i: lines.dates(date_index, positions[i]))
+            for i, (path, date) in enumerate(paths, 1):
+                file.write(f"{i: >10} | {date} | {path}\n")
             file.write('\n')
 
+def submit_graph(renderer, x_data: list, y_data: dict, title: str, xlabel: str, file_path: str, **kwargs):
+    labels = []
+    lines = []
+    for k, v in y_data.items():
+        lines.append((x_data, [log(1 + i) for i in v], {'label': k}))
+        labels.append(k)
+
+    if len(labels) > 5:
+        legend_kwargs = {'loc': 'upper left', 'prop': {'size': 7}, 'bbox_to_anchor': (1.02, 1.05)}
+    else:
+        legend_kwargs = {'prop': {'size': 7}}
+    renderer.submit(save_line_figure, file_path, lines, title=title, ylabel='Natural logarithm of 1+count',
+                    xlabel=xlabel, legend=True, legend_labels=labels, legend_kwargs=legend_kwargs,
+                    bbox_inches='tight', **kwargs)
+
 
-def make_year_graph(lines: list, date_index: int, cat_index: int, start: int, end: int, tz,
-                    mac: str, category: str, base_dir):
+def make_year_graph(lines: MacLines, date_index: int, cat_index: int, start: int, end: int, tz,
+                    mac: str, category: str, base_dir, renderer):
 
     print(f'Creating graph for {category} of files {mac} from {start} to {end}')
     # create x data
@@ -45,34 +116,18 @@ def make_year_graph(lines: list, date_index: int, cat_index: int, start: int, en
     for i in range(X_RES):
         x_data.append(datetime.fromtimestamp(start_date.timestamp() + (increment * i), tz=tz))
 
-    # create y data
-    y_data = defaultdict(lambda: [0] * X_RES)
-    grouped_lines = defaultdict(list) # Used to create the text file containing the file paths grouped by category
-    for line in lines:
-        y_data[line[cat_index]][int((line[date_index].timestamp() - start_date.timestamp()) // increment)] += 1
-        grouped_lines[line[cat_index]].append(line)
+    # create y data and the lines grouped by category, used to create the text file
+    # containing the file paths
+    index = (lines.utc[date_index] - start_date.timestamp()) // increment
+    y_data, grouped_lines = lines.count(cat_index, index)
 
-    plt.title(f'{category} of files {mac} from {start} to {end}')
-    plt.ylabel(f'Natural logarithm of 1+count')
-    plt.xlabel(f'Date', fontsize=8)
-    plt.xticks(rotation=45)
+    submit_graph(renderer, x_data, y_data, f'{category} of files {mac} from {start} to {end}', 'Date',
+                 join(base_dir, f'{category.lower()}-{mac.lower()}-{start}-{end}'), xlabel_size=8, xtick_rotation=45)
 
-    labels = []
-    for k, v in y_data.items():
-        plt.plot(x_data, [log(1 + i) for i in v], label=k)
-        labels.append(k)
-
-    if len(labels) > 5:
-        plt.legend(labels, loc='upper left', prop={'size': 7}, bbox_to_anchor=(1.02, 1.05))
-    else:
-        plt.legend(labels, prop={'size': 7})
-    plt.savefig(join(base_dir, f'{category.lower()}-{mac.lower()}-{start}-{end}'), bbox_inches='tight')
-    plt.close()
-
-    create_path_list(grouped_lines, date_index, mac, category, base_dir)
+    create_path_list(lines, grouped_lines, date_index, mac, category, base_dir)
 
-def make_minute_graph(lines: list, date_index: int, cat_index: int, start: int, end: int, tz,
-                    mac: str, category: str, base_dir):
+def make_minute_graph(lines: MacLines, date_index: int, cat_index: int, start: int, end: int, tz,
+                    mac: str, category: str, base_dir, renderer):
 
     print(f'Creating graph for {category} of files {mac} from hours {start} to {end}')
     # create x data
@@ -88,33 +143,16 @@ def make_minute_graph(lines: list, date_index: int, cat_index: int, start: int,
 
     # create y data
     SECS_IN_HOUR = 3600
-    y_data = defaultdict(lambda: [0] * X_RES)
-    grouped_lines = defaultdict(list)
-    for line in lines:
-        index = int(((line[date_index].timestamp() % SECS_IN_HOUR) - start_sec) // increment)
-        y_data[line[cat_index]][index] += 1
-        grouped_lines[line[cat_index]].append(line)
-
-    plt.title(f'{category} of files {mac} from minutes {start} to {end + 1}')
-    plt.ylabel(f'Natural logarithm of 1+count')
-    plt.xlabel(f'Minutes')
+    index = ((lines.utc[date_index] % SECS_IN_HOUR) - start_sec) // increment
+    y_data, grouped_lines = lines.count(cat_index, index)
 
-    labels = []
-    for k, v in y_data.items():
-        plt.plot(x_data, [log(1 + i) for i in v], label=k)
-        labels.append(k)
-
-    if len(labels) > 5:
-        plt.legend(labels, loc='upper left', prop={'size': 7}, bbox_to_anchor=(1.02, 1.05))
-    else:
-        plt.legend(labels, prop={'size': 7})
-    plt.savefig(join(base_dir, f'{category.lower()}-{mac.lower()}-mins-{start}-{end}'), bbox_inches='tight')
-    plt.close()
+    submit_graph(renderer, x_data, y_data, f'{category} of files {mac} from minutes {start} to {end + 1}', 'Minutes',
+                 join(base_dir, f'{category.lower()}-{mac.lower()}-mins-{start}-{end}'))
 
-    create_path_list(grouped_lines, date_index, mac, category, base_dir)
+    create_path_list(lines, grouped_lines, date_index, mac, category, base_dir)
 
-def make_hour_graph(lines: list, date_index: int, cat_index: int, start: int, end: int, tz,
-                    mac: str, category: str, base_dir):
+def make_hour_graph(lines: MacLines, date_index: int, cat_index: int, start: int, end: int, tz,
+                    mac: str, category: str, base_dir, renderer):
 
     print(f'Creating graph for {category} of files {mac} from hours {start} to {end}')
     # create x data
@@ -130,33 +168,16 @@ def make_hour_graph(lines: list, date_index: int, cat_index: int, start: int, en
 
     # create y data
     DAY_IN_SECS = 24 * 3600
-    y_data = defaultdict(lambda: [0] * X_RES)
-    grouped_lines = defaultdict(list)
-    for line in lines:
-        index = int(((line[date_index].timestamp() % DAY_IN_SECS) - start_sec) // increment)
-        y_data[line[cat_index]][index] += 1
-        grouped_lines[line[cat_index]].append(line)
-
-    plt.title(f'{category} of files {mac} from hours {start} to {end}')
-    plt.ylabel(f'Natural logarithm of 1+count')
-    plt.xlabel(f'Hours')
-
-    labels = []
-    for k, v in y_data.items():
-        plt.plot(x_data, [log(1 + i) for i in v], label=k)
-        labels.append(k)
+    index = ((lines.utc[date_index] % DAY_IN_SECS) - start_sec) // increment
+    y_data, grouped_lines = lines.count(cat_index, index)
 
-    if len(labels) > 5:
-        plt.legend(labels, loc='upper left', prop={'size': 7}, bbox_to_anchor=(1.02, 1.05))
-    else:
-        plt.legend(labels, prop={'size': 7})
-    plt.savefig(join(base_dir, f'{category.lower()}-{mac.lower()}-hours-{start}-{end}'), bbox_inches='tight')
-    plt.close()
+    submit_graph(renderer, x_data, y_data, f'{category} of files {mac} from hours {start} to {end}', 'Hours',
+                 join(base_dir, f'{category.lower()}-{mac.lower()}-hours-{start}-{end}'))
 
-    create_path_list(grouped_lines, date_index, mac, category, base_dir)
+    create_path_list(lines, grouped_lines, date_index, mac, category, base_dir)
 
-def make_week_graph(lines: list, date_index: int, cat_index: int, start: int, end: int, tz,
-                    mac: str, category: str, base_dir):
+def make_week_graph(lines: MacLines, date_index: int, cat_index: int, start: int, end: int, tz,
+                    mac: str, category: str, base_dir, renderer):
 
     print(f'Creating graph for {category} of files {mac} from week days {start} to {end}')
     # create x data
@@ -173,105 +194,57 @@ def make_week_graph(lines: list, date_index: int, cat_index: int, start: int, en
 
     # create y data
     # WEEK_IN_SECS = 24 * 3600 * 7
-    y_data = defaultdict(lambda: [0] * X_RES)
-    grouped_lines = defaultdict(list)
-    for line in lines:
-        # index = int(((line[date_index].timestamp() % WEEK_IN_SECS) - start_sec) // increment)
-        d = line[date_index]
-        index = int(((d.weekday() * 3600 * 24) + (d.hour * 3600) + (d.minute * 60) + round(d.second) - start_sec) // increment)
-        y_data[line[cat_index]][index] += 1
-        grouped_lines[line[cat_index]].append(line)
+    # seconds since monday midnight in local time
+    local = lines.local[date_index]
+    index = ((weekday(local) * SECS_IN_DAY) + (local % SECS_IN_DAY) - start_sec) // increment
+    y_data, grouped_lines = lines.count(cat_index, index)
 
     if start == end:
-        plt.title(f'{category} of files {mac} on week day {start}')
+        title = f'{category} of files {mac} on week day {start}'
     else:
-        plt.title(f'{category} of files {mac} from week days {start} to {end}')
-    plt.ylabel(f'Natural logarithm of 1+count')
-    plt.xlabel(f'Week Day')
+        title = f'{category} of files {mac} from week days {start} to {end}'
+    submit_graph(renderer, x_data, y_data, title, 'Week Day',
+                 join(base_dir, f'{category.lower()}-{mac.lower()}-week-days-{start}-{end}'))
 
-    labels = []
-    for k, v in y_data.items():
-        plt.plot(x_data, [log(1 + i) for i in v], label=k)
-        labels.append(k)
+    create_path_list(lines, grouped_lines, date_index, mac, category, base_dir)
 
-    if len(labels) > 5:
-        plt.legend(labels, loc='upper left', prop={'size': 7}, bbox_to_anchor=(1.02, 1.05))
-    else:
-        plt.legend(labels, prop={'size': 7})
-    plt.savefig(join(base_dir, f'{category.lower()}-{mac.lower()}-week-days-{start}-{end}'), bbox_inches='tight')
-    plt.close()
-
-    create_path_list(grouped_lines, date_index, mac, category, base_dir)
-
-def year_filter(lines: list, start: int, end: int, tz, base_dir: str):
-    mlines = []
-    alines = []
-    clines = []
-    for line in lines:
-        if line[13].year >= start and line[13].year <= end:
-            clines.append(line)
-        if line[14].year >= start and line[14].year <= end:
-            mlines.append(line)
-        if line[15].year >= start and line[15].year <= end:
-            alines.append(line)
+def year_filter(lines: MacLines, start: int, end: int, tz, base_dir: str, renderer):
+    years = [year(lines.local[i]) for i in [13, 14, 15]]
+    clines, mlines, alines = [lines.subset((y >= start) & (y <= end)) for y in years]
 
     for lines, date_index, date_type in zip([clines, mlines, alines], [13, 14, 15], ['created', 'modified', 'accessed']):
         for cat_index, cat_type in zip([7, 8, 6], ['Topdirs', 'Botdirs', 'Extensions']):
-            make_year_graph(lines, date_index, cat_index, start, end, tz, date_type, cat_type, base_dir)
-
-def hour_of_day_filter(lines: list, start: int, end: int, tz, base_dir):
-    mlines = []
-    alines = []
-    clines = []
+            make_year_graph(lines, date_index, cat_index, start, end, tz, date_type, cat_type, base_dir, renderer)
 
+def hour_of_day_filter(lines: MacLines, start: int, end: int, tz, base_dir, renderer):
     DAY_IN_SECS = 3600 * 24
     start_sec = 3600 * start
     end_sec = 3600 * (end + 1)
-    for line in lines:
-        for d, l in zip(line[13:16], [clines, mlines, alines]):
-            ts = d.timestamp()
-            if ts % DAY_IN_SECS >= start_sec and ts % DAY_IN_SECS < end_sec:
-                l.append(line)
+    secs = [lines.utc[i] % DAY_IN_SECS for i in [13, 14, 15]]
+    clines, mlines, alines = [lines.subset((ts >= start_sec) & (ts < end_sec)) for ts in secs]
+
     for lines, date_index, date_type in zip([clines, mlines, alines], [13, 14, 15], ['created', 'modified', 'accessed']):
         for cat_index, cat_type in zip([7, 8, 6], ['Topdirs', 'Botdirs', 'Extensions']):
-            make_hour_graph(lines, date_index, cat_index, start, end, tz, date_type, cat_type, base_dir)
-
-def minute_filter(lines: list, start: int, end: int, tz, base_dir: str):
-    mlines = []
-    alines = []
-    clines = []
+            make_hour_graph(lines, date_index, cat_index, start, end, tz, date_type, cat_type, base_dir, renderer)
 
+def minute_filter(lines: MacLines, start: int, end: int, tz, base_dir: str, renderer):
     SECS_IN_HOUR = 3600
     start_min = 60 * start
     end_min = 60 * (end + 1)
-    for line in lines:
-        for d, l in zip(line[13:16], [clines, mlines, alines]):
-            ts = d.timestamp()
-            if ts % SECS_IN_HOUR >= start_min and ts % SECS_IN_HOUR < end_min:
-                l.append(line)
+    secs = [lines.utc[i] % SECS_IN_HOUR for i in [13, 14, 15]]
+    clines, mlines, alines = [lines.subset((ts >= start_min) & (ts < end_min)) for ts in secs]
 
     for lines, date_index, date_type in zip([clines, mlines, alines], [13, 14, 15], ['created', 'modified', 'accessed']):
         for cat_index, cat_type in zip([7, 8, 6], ['Topdirs', 'Botdirs', 'Extensions']):
-            make_minute_graph(lines, date_index, cat_index, start, end, tz, date_type, cat_type, base_dir)
-
-
-def day_of_week_filter(lines: list, start: int, end: int, tz, base_dir: str):
-    mlines = []
-    alines = []
-    clines = []
-
-    # WEEK_IN_SECS = 3600 * 24 * 7
-    # start_sec = 3600 * 24 * start
-    # end_sec = 3600 * 24 * (end + 1)
-    for line in lines:
-        for d, l in zip(line[13:16], [clines, mlines, alines]):
-            ts = d.timestamp()
-            # if ts % WEEK_IN_SECS >= start_sec and ts % WEEK_IN_SECS < end_sec:
-            if d.weekday() >= start and d.weekday() < end + 1:
-                l.append(line)
+            make_minute_graph(lines, date_index, cat_index, start, end, tz, date_type, cat_type, base_dir, renderer)
+
+
+def day_of_week_filter(lines: MacLines, start: int, end: int, tz, base_dir: str, renderer):
+    days = [weekday(lines.local[i]) for i in [13, 14, 15]]
+    clines, mlines, alines = [lines.subset((d >= start) & (d < end + 1)) for d in days]
     for lines, date_index, date_type in zip([clines, mlines, alines], [13, 14, 15], ['created', 'modified', 'accessed']):
         for cat_index, cat_type in zip([7, 8, 6], ['Topdirs', 'Botdirs', 'Extensions']):
-            make_week_graph(lines, date_index, cat_index, start, end, tz, date_type, cat_type, base_dir)
+            make_week_graph(lines, date_index, cat_index, start, end, tz, date_type, cat_type, base_dir, renderer)
 
 filters = {
     'year': year_filter,
@@ -280,44 +253,44 @@ filters = {
     'hour': hour_of_day_filter,
 }
 
-def make_graphs(file_name: str, filter_type: str, start: str, end: str, tz: str=None):
-    start = int(start)
-    end = int(end)
-    if tz:
-        TIMEZONE = pytz.timezone(f"Etc/{tz}")
-    else:
-        TIMEZONE = UTC
-
-    filter = filters[filter_type]
+class TimeReport:
+    def __init__(self, filter_type: str, start: str, end: str, tz: str=None):
+        self.filter_type = filter_type
+        self.start = int(start)
+        self.end = int(end)
+        if tz:
+            self.tz = timezone(f"Etc/{tz}")
+        else:
+            self.tz = UTC
+        self.filter = filters[filter_type]
+        self._rows = []
+
+    def accumulate(self, cols, start: int, stop: int):
+        # only files with all three mac times are used
+        has_times = (cols['crtime'][start:stop] != MISSING) & (cols['mtime'][start:stop] != MISSING) & \
+            (cols['atime'][start:stop] != MISSING)
+        self._rows.append(np.flatnonzero(has_times) + start)
+
+    def finish(self, cols, file_name: str, renderer):
+        rows = np.concatenate(self._rows) if self._rows else np.empty(0, dtype=np.int64)
+        lines = MacLines.load(cols, rows, self.tz)
+
+        # determine basedir
+        type_desc = {
+            'year': 'years',
+            'week': 'week-days',
+            'min': 'mins',
+            'hour': 'hours'
+        }
+        base_dir = f"{get_name(file_name).replace('.', '_')}-{type_desc[self.filter_type]}-{self.start}-{self.end}"
+        if not exists(base_dir):
+            mkdir(base_dir)
+
+        # filter the creation times
+        self.filter(lines, self.start, self.end, self.tz, base_dir, renderer)
 
-    # load lines of file
-    lines = []
-    with open(file_name, 'r') as file:
-        for line in file:
-            # convert dates to datetime objects and load the extension categories
-            line = line.rstrip().split('|')
-            if line[13] and line[14] and line[15]:
-                line[13] = datetime.fromtimestamp(int(line[13])).astimezone(TIMEZONE)
-                line[14] = datetime.fromtimestamp(int(line[14])).astimezone(TIMEZONE)
-                line[15] = datetime.fromtimestamp(int(line[15])).astimezone(TIMEZONE)
-                line[7] = EXTENSIONS.get(line[7], line[7])
-                line[6] = EXTENSIONS.get(line[6], line[6])
-                line[8] = EXTENSIONS.get(line[8], line[8])
-                lines.append(line)
-
-    # determine basedir
-    type_desc = {
-        'year': 'years',
-        'week': 'week-days',
-        'min': 'mins',
-        'hour': 'hours'
-    }
-    base_dir = f"{basename(file_name).replace('.', '_')}-{type_desc[filter_type]}-{start}-{end}"
-    if not exists(base_dir):
-        mkdir(base_dir)
-
-    # filter the creation times
-    filter(lines, start, end, TIMEZONE, base_dir)
+def make_graphs(file_name: str, filter_type: str, start: str, end: str, tz: str=None):
+    run_reports(file_name, [TimeReport(filter_type, start, end, tz)])
 
 if __name__ == '__main__':
    make_graphs(*argv[1:])
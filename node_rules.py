@@ -0,0 +1,120 @@
+import re
+
+# Rules that colour the nodes of the email network. A rules file has one
+# '<kind>|<pattern>|<color>' rule per line, or a comment starting with '#', where kind is
+#   exact      the node is the pattern
+#   substring  the node contains the pattern
+#   regex      the pattern matches anywhere in the node
+#   domain     the node is an address at the pattern domain or one of its subdomains
+# The first rule that matches wins. All rules are compiled into one regex of ordered
+# lookaheads, so a node is matched once instead of once per rule, and the colour of each
+# node is remembered. Each regex is compiled on its own first, so a bad one is reported
+# with its rule, and leading inline flags such as (?i) are scoped to it. Regexes that
+# refer to their own groups (named groups, backreferences) cannot share one regex with the
+# others; if there are any, the rules are matched one by one.
+
+RULES_FILE = 'node-rules.txt'
+DEFAULT_RULES = [
+    ('exact', 'shepherd, denise', 'green'),
+    ('exact', 'gegg, emily', 'green'),
+    ('substring', 'escada', 'orange'),
+    ('substring', '@', 'gray'),
+]
+RULE_PATTERNS = {
+    'exact': lambda p: re.escape(p.lower()) + r'\Z',
+    'substring': lambda p: '.*?' + re.escape(p.lower()),
+    'regex': lambda p: '.*?' + scope_flags(p),
+    'domain': lambda p: r'.*@(?:[^@]*\.)?' + re.escape(p.lower().lstrip('@')) + r'\Z',
+}
+
+GLOBAL_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+def scope_flags(pattern: str):
+    # wrap a regex in a group, turning its leading global flags, e.g. (?i), into flags of
+    # that group so they do not apply to the other rules
+    flags = ''
+    match = GLOBAL_FLAGS.match(pattern)
+    while match:
+        flags += match.group(1)
+        pattern = pattern[match.end():]
+        match = GLOBAL_FLAGS.match(pattern)
+    return f'(?{flags}:{pattern})'
+
+def compile_rule(kind: str, pattern: str):
+    if kind not in RULE_PATTERNS:
+        raise ValueError(f'Unknown rule type {kind}')
+    try:
+        return re.compile(RULE_PATTERNS[kind](pattern), re.DOTALL)
+    except re.error as e:
+        raise ValueError(f'Bad {kind} pattern {pattern!r}: {e}')
+
+def is_self_referencing(kind: str, pattern: str, compiled: re.Pattern):
+    return kind == 'regex' and (bool(compiled.groupindex) or GROUP_REFERENCE.search(pattern) is not None)
+
+def load_rules(file_path: str=RULES_FILE):
+    rules = []
+    with open(file_path, 'r') as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            # a regex may contain '|', the colour never does
+            kind, rest = line.split('|', 1)
+            pattern, color = rest.rsplit('|', 1)
+            kind, pattern, color = kind.strip(), pattern.strip(), color.strip()
+            try:
+                compile_rule(kind, pattern)
+            except ValueError as e:
+                raise ValueError(f'{file_path}:{number}: {e}')
+            rules.append((kind, pattern, color))
+    return rules
+
+class NodeClassifier:
+    def __init__(self, rules: list=None):
+        rules = DEFAULT_RULES if rules is None else rules
+        self.colors = [color for _, _, color in rules]
+        self.regexes = []
+        for i, (kind, pattern, _) in enumerate(rules):
+            try:
+                self.regexes.append(compile_rule(kind, pattern))
+            except ValueError as e:
+                raise ValueError(f'Rule {i + 1}: {e}')
+        self.matcher = None
+        self._colors = {}
+        if not self.regexes or any(is_self_referencing(kind, pattern, regex)
+                                   for (kind, pattern, _), regex in zip(rules, self.regexes)):
+            return
+
+        # the empty group after each lookahead is the last group closed when that rule
+        # matches, so lastindex identifies the rule even if its regex has groups of its own
+        parts = []
+        self._rules = {}
+        group = 0
+        for i, ((kind, pattern, _), regex) in enumerate(zip(rules, self.regexes)):
+            parts.append(f'(?={RULE_PATTERNS[kind](pattern)})()')
+            group += regex.groups + 1
+            self._rules[group] = i
+        self.matcher = re.compile('|'.join(parts), re.DOTALL)
+
+    def color(self, name: str):
+        try:
+            return self._colors[name]
+        except KeyError:
+            pass
+        color = None
+        if self.matcher is not None:
+            match = self.matcher.match(name)
+            if match:
+                color = self.colors[self._rules[match.lastindex]]
+        else:
+            for regex, rule_color in zip(self.regexes, self.colors):
+                if regex.match(name):
+                    color = rule_color
+                    break
+        self._colors[name] = color
+        return color
+
+    def style(self, name: str):
+        color = self.color(name)
+        return {'color': color} if color else {}
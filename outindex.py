@@ -0,0 +1,88 @@
+from sys import argv
+from os.path import join, isfile
+import numpy as np
+from columns import open_columns, MISSING
+from compressed import open_file, is_compressed
+
+# Sorted index per column of a .out file, kept in its columnar cache directory. Each
+# index is the stable argsort of the column and the sorted values, so a range lookup is
+# two binary searches on the sorted values plus a slice of the row numbers. Indexes are
+# built on first use and are dropped with the cache when the .out file changes.
+
+INDEXED_COLUMNS = ['inode', 'size', 'crtime', 'mtime', 'atime', 'depth']
+
+class OutIndex:
+    def __init__(self, cols):
+        self.cols = cols
+        self._indexes = {}
+
+    def build(self, column: str):
+        values = np.asarray(self.cols[column])
+        order = np.argsort(values, kind='stable')
+        np.save(join(self.cols.cache_dir, f'{column}.order.npy'), order)
+        np.save(join(self.cols.cache_dir, f'{column}.sorted.npy'), values[order])
+
+    def get(self, column: str):
+        if column not in INDEXED_COLUMNS:
+            raise ValueError(f'{column} is not indexed, use one of {", ".join(INDEXED_COLUMNS)}')
+        if column not in self._indexes:
+            order_path = join(self.cols.cache_dir, f'{column}.order.npy')
+            if not isfile(order_path):
+                self.build(column)
+            self._indexes[column] = (
+                np.load(order_path, mmap_mode='r'),
+                np.load(join(self.cols.cache_dir, f'{column}.sorted.npy'), mmap_mode='r'),
+            )
+        return self._indexes[column]
+
+    def rows(self, column: str, lo: int, hi: int):
+        # row numbers, in file order, of the rows with lo <= value <= hi. Empty values
+        # are never returned.
+        order, values = self.get(column)
+        lo = max(lo, MISSING + 1)
+        start = np.searchsorted(values, lo, 'left')
+        end = np.searchsorted(values, hi, 'right')
+        return np.sort(order[start:end])
+
+    def offsets(self, column: str, lo: int, hi: int):
+        # byte offsets in the .out file of the rows with lo <= value <= hi
+        return self.cols['offset'][self.rows(column, lo, hi)]
+
+def open_index(out_path: str):
+    return OutIndex(open_columns(out_path))
+
+def read_lines(out_path: str, offsets):
+    if is_compressed(out_path):
+        yield from read_compressed_lines(out_path, offsets)
+        return
+    with open(out_path, 'rb') as file:
+        for offset in offsets:
+            file.seek(offset)
+            yield file.readline().decode('utf-8')
+
+def read_compressed_lines(out_path: str, offsets):
+    # a compressed stream cannot seek, so decompress it once and keep the wanted lines
+    wanted = set(offsets)
+    lines = {}
+    with open_file(out_path, 'rb') as file:
+        offset = 0
+        for raw in file:
+            if offset in wanted:
+                lines[offset] = raw.decode('utf-8')
+                if len(lines) == len(wanted):
+                    break
+            offset += len(raw)
+    for offset in offsets:
+        yield lines[offset]
+
+
+if __name__ == '__main__':
+    if len(argv) < 5:
+        print('Usage: outindex.py <out file> <column> <min> <max>')
+        print(f'Prints the rows with min <= column <= max. Columns: {", ".join(INDEXED_COLUMNS)}')
+        exit()
+
+    out_path, column, lo, hi = argv[1:5]
+    offsets = open_index(out_path).offsets(column, int(lo), int(hi))
+    for line in read_lines(out_path, offsets.tolist()):
+        print(line, end='')
@@ -0,0 +1,57 @@
+from heapq import merge
+from operator import itemgetter
+from os import environ
+from tempfile import TemporaryFile
+import numpy as np
+
+# Sorted (path, value) streams for the *-file-list.txt outputs. Rows are handled as
+# row numbers into the columnar cache; paths are only read for the rows being written,
+# at most PATH_LIST_BUDGET rows at a time. Lists sorted by path that do not fit in the
+# budget are sorted in runs that are spilled to temporary files and merged.
+
+def get_budget():
+    return int(environ.get('PATH_LIST_BUDGET', 0)) or 1 << 20
+
+def read_run(run):
+    for line in run:
+        path, value = line[:-1].rsplit('|', 1)
+        yield path, value
+
+def iter_by_path(cols, rows: np.ndarray, values, budget: int):
+    if len(rows) <= budget:
+        positions = np.arange(len(rows))
+        yield from sorted(zip(cols.paths(rows), values(positions)), key=itemgetter(0))
+        return
+
+    # paths never contain '|', which separates the path from the value in a run
+    runs = []
+    try:
+        for start in range(0, len(rows), budget):
+            positions = np.arange(start, min(start + budget, len(rows)))
+            run = TemporaryFile('w+', encoding='utf-8')
+            runs.append(run)
+            for path, value in sorted(zip(cols.paths(rows[positions]), values(positions)), key=itemgetter(0)):
+                run.write(f"{path}|{value}\n")
+            run.seek(0)
+        # merge() takes equal paths from earlier runs first, which keeps the sort stable
+        yield from merge(*[read_run(run) for run in runs], key=itemgetter(0))
+    finally:
+        for run in runs:
+            run.close()
+
+def iter_sorted_paths(cols, rows: np.ndarray, keys: np.ndarray=None, values=None, budget: int=None):
+    # yield (path, value) for each row, in file order within equal sort keys. Rows are
+    # sorted by keys, or by path if keys is None. values(positions) returns the values
+    # for positions into rows and defaults to the keys.
+    budget = budget or get_budget()
+    if values is None:
+        values = lambda positions: keys[positions].tolist()
+
+    if keys is None:
+        yield from iter_by_path(cols, rows, values, budget)
+        return
+
+    order = np.argsort(keys, kind='stable')
+    for start in range(0, len(order), budget):
+        positions = order[start:start + budget]
+        yield from zip(cols.paths(rows[positions]), values(positions))
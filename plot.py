@@ -1,15 +1,16 @@
-import xml.etree.ElementTree as et
-from math import log, e
 from sys import argv
 from datetime import datetime, timedelta
-from os.path import exists, isdir, join, basename
+from os.path import exists, isdir, join
 from os import mkdir
 from time import time
 import pytz
-from collections import defaultdict
 import csv
-import matplotlib as mpl
-import matplotlib.pyplot as plt
+import numpy as np
+from compressed import get_name
+from columns import open_columns, ordered_groups, MISSING
+from histogram import MacTimes, inode_bins, depth_bins, log_size_bins
+from render import Renderer, save_line_figure
+from instrument import stage
 
 # CONSTANTS - adjust as necessary
 START_YEAR = 1995
@@ -36,15 +37,16 @@ else:
 DTD = '{http://www.forensicswiki.org/wiki/Category:Digital_Forensics_XML}'
 TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
-# Parse the out file
+# Load the columnar cache of the out file, compiling it on first use
 t0 = time()
 print(f'Loading {argv[1]}...', end=' ', flush=True)
-with open(argv[1], 'r') as file:
-    lines = file.readlines()
+with stage('load', file=argv[1]) as s:
+    cols = open_columns(argv[1])
+    s.rows = len(cols)
 print(f'Completed in {round(time() - t0, 3)} seconds.')
 
 # Get the drive name from file name
-file_name = basename(argv[1])
+file_name = get_name(argv[1])
 if file_name.rfind('.') > 0:
     drive_name = file_name[:file_name.rfind('.')].replace('.', '_')
 else:
@@ -58,62 +60,41 @@ if not isdir(output_dir) or not exists(output_dir):
     mkdir(output_dir)
 
 
+# Figures are drawn in worker processes while the next series is computed
+renderer = Renderer().start()
+
 # Retrieve necessary data from text file ----------------------------------------------------------
 t0 = time()
 print('Gathering data...', end=' ', flush=True)
 
-inodes = []
-mtimes = []
-atimes = []
-ctimes = []
-depths = []
-sizes = []
-file_paths = []
-
-for i, line in enumerate(lines):
-    line = line.rstrip().split('|')
-
-    inodes.append(int(line[12]))
-
-    # add the mac times to the list
-    if line[13] and line[14] and line[15] :
-        mtimes.append(datetime.fromtimestamp(int(line[14])).astimezone(TIMEZONE))
-        atimes.append(datetime.fromtimestamp(int(line[15])).astimezone(TIMEZONE))
-        ctimes.append(datetime.fromtimestamp(int(line[13])).astimezone(TIMEZONE))
+with stage('bin', graph='data', rows=len(cols)):
+    inodes = cols['inode']
 
-    # add the depth of file into the depths list
-    filename = line[16]
-    depths.append(len(filename.split('/')))
+    # only use the mac times of files that have all three
+    ctimes, mtimes, atimes = cols['crtime'], cols['mtime'], cols['atime']
+    has_times = (ctimes != MISSING) & (mtimes != MISSING) & (atimes != MISSING)
+    mac_times = MacTimes(ctimes[has_times], mtimes[has_times], atimes[has_times], TIMEZONE)
 
-    # add the filename to file_paths
-    file_paths.append(filename)
+    depths = cols['depth']
 
-    # add the size of file into the sizes list
-    if line[9]:
-        sizes.append(int(line[9]))
+    # only use the sizes of files that have one
+    sizes = cols['size']
+    sizes = sizes[sizes != MISSING]
 
 print(f'Completed in {round(time() - t0, 3)} seconds.')
 
 # plot the inodes graphs ------------------------------------------------------------------
 t0 = time()
 print('Generating inodes graph...', end=' ', flush=True)
-max_inode = max(inodes)
-DIVISOR = round(max_inode / INODES_XRES)
-length = (max_inode // (DIVISOR - 1)) + 1
-inode_counts = [0] * length
+with stage('bin', graph='inodes', rows=len(inodes)):
+    max_inode = int(inodes.max())
+    DIVISOR = round(max_inode / INODES_XRES)
+    length = (max_inode // (DIVISOR - 1)) + 1
+    inode_counts = inode_bins(inodes, DIVISOR, length)
 
-
-for inode in inodes:
-    inode_counts[inode // DIVISOR] += 1
-
-fig, ax = plt.subplots()
-ax.set_title(drive_name)
-ax.set_ylabel('Natural logarithm of 1+count')
-ax.set_xlabel('Inode Number')
-ax.plot([i * DIVISOR for i in range(len(inode_counts))], [log(1 + i, e) for i in inode_counts], linewidth=.75)
-
-plt.savefig(join(output_dir, f'{drive_name}-inodes'))
-plt.close()
+renderer.submit(save_line_figure, join(output_dir, f'{drive_name}-inodes'),
+                [([i * DIVISOR for i in range(len(inode_counts))], np.log(1 + inode_counts), {'linewidth': .75})],
+                title=drive_name, ylabel='Natural logarithm of 1+count', xlabel='Inode Number')
 
 
 # Create all time usage graph -------------------------------------------------------
@@ -123,7 +104,7 @@ print('Generating all time usage graph...', end=' ', flush=True)
 # plot the alltime usage
 # min_date = min(mtimes) - timedelta(days=365)
 min_date = datetime(START_YEAR, 1, 1).astimezone(TIMEZONE)
-max_date = max(atimes) + timedelta(days=365)
+max_date = datetime.fromtimestamp(mac_times.max_atime()).astimezone(TIMEZONE) + timedelta(days=365)
 # min_date = min(min(mtimes), min(atimes), min(ctimes)) - timedelta(days=365)
 # max_date = max(max(mtimes), max(ctimes), max(atimes)) + timedelta(days=365)
 
@@ -132,41 +113,18 @@ duration = max_date - min_date
 DIVISOR = int(round(duration.total_seconds() / ALL_TIME_USAGE_XRES))
 length = (int(duration.total_seconds()) // DIVISOR) + 1
 
-ctime_counts = [0] * length
-atime_counts = [0] * length
-mtime_counts = [0] * length
-
-all_times = zip(mtimes, atimes, ctimes)
-for mtime, atime, ctime in all_times:
-    index = int((mtime - min_date).total_seconds()) // DIVISOR
-    if index < len(mtime_counts) and index >= 0:
-        mtime_counts[index] += 1
-    index = int((atime - min_date).total_seconds()) // DIVISOR
-    if index < len(atime_counts) and index >= 0:
-        atime_counts[index] += 1
-    index = int((ctime - min_date).total_seconds()) // DIVISOR
-    if index < len(ctime_counts) and index >= 0:
-        ctime_counts[index] += 1
+with stage('bin', graph='all-time', rows=len(mac_times)):
+    ctime_counts, mtime_counts, atime_counts = mac_times.all_time(round(min_date.timestamp()), DIVISOR, length)
 
 # Plot them all
-fig, ax = plt.subplots()
-ax.set_title(drive_name)
-ax.set_ylabel('Natural logarithm of 1+count')
-ax.set_xlabel('Year')
-
 # create the x-axis
 LINE_WIDTH = .75
 x_data = [min_date + timedelta(seconds=i * DIVISOR) for i in range(length)]
-y_data = [log(1 + count, e) for count in ctime_counts]
-ax.plot(x_data, y_data, color="red", linewidth=LINE_WIDTH, label='creation')
-y_data = [log(1 + count, e) for count in mtime_counts]
-ax.plot(x_data, y_data, color="green", linewidth=LINE_WIDTH, label='modification')
-y_data = [log(1 + count, e) for count in atime_counts]
-ax.plot(x_data, y_data, color="blue", linewidth=LINE_WIDTH, label='access')
-
-plt.legend()
-plt.savefig(join(output_dir, f'{drive_name}-all-time'))
-plt.close()
+renderer.submit(save_line_figure, join(output_dir, f'{drive_name}-all-time'), [
+    (x_data, np.log(1 + ctime_counts), {'color': 'red', 'linewidth': LINE_WIDTH, 'label': 'creation'}),
+    (x_data, np.log(1 + mtime_counts), {'color': 'green', 'linewidth': LINE_WIDTH, 'label': 'modification'}),
+    (x_data, np.log(1 + atime_counts), {'color': 'blue', 'linewidth': LINE_WIDTH, 'label': 'access'}),
+], title=drive_name, ylabel='Natural logarithm of 1+count', xlabel='Year', legend=True)
 
 print(f'Completed in {round(time() - t0, 3)} seconds.')
 
@@ -174,37 +132,17 @@ print(f'Completed in {round(time() - t0, 3)} seconds.')
 t0 = time()
 print('Generating weekly usage graph...', end=' ', flush=True)
 
-ctime_counts = [0] * WEEKLY_USAGE_XRES
-atime_counts = [0] * WEEKLY_USAGE_XRES
-mtime_counts = [0] * WEEKLY_USAGE_XRES
-
-get_index = lambda _time: round((WEEKLY_USAGE_XRES - 1) * ((_time.weekday() + \
-    (((_time.hour * 60 * 60) + (_time.minute * 60) + _time.second) / (60*60*24))) / 7))
-
-for mtime, atime, ctime in zip(mtimes, atimes, ctimes):
-    mtime_counts[get_index(mtime)] += 1
-    atime_counts[get_index(atime)] += 1
-    ctime_counts[get_index(ctime)] += 1
+with stage('bin', graph='week', rows=len(mac_times)):
+    ctime_counts, mtime_counts, atime_counts = mac_times.weekly(WEEKLY_USAGE_XRES)
 
 # Create x_axis
 x_data = [(7 / WEEKLY_USAGE_XRES) * i for i in range(WEEKLY_USAGE_XRES)]
-fig, ax = plt.subplots()
-ax.set_title(drive_name)
-ax.set_ylabel('Natural logarithm of 1+count')
-ax.set_xlabel('Days Starting Monday midnight')
-
-# create the x-axis
 LINE_WIDTH = .75
-y_data = [log(1 + count, e) for count in ctime_counts]
-ax.plot(x_data, y_data, color="red", linewidth=LINE_WIDTH, label='creation')
-y_data = [log(1 + count, e) for count in mtime_counts]
-ax.plot(x_data, y_data, color="green", linewidth=LINE_WIDTH, label='modification')
-y_data = [log(1 + count, e) for count in atime_counts]
-ax.plot(x_data, y_data, color="blue", linewidth=LINE_WIDTH, label='access')
-
-plt.legend()
-plt.savefig(join(output_dir, f'{drive_name}-week'))
-plt.close()
+renderer.submit(save_line_figure, join(output_dir, f'{drive_name}-week'), [
+    (x_data, np.log(1 + ctime_counts), {'color': 'red', 'linewidth': LINE_WIDTH, 'label': 'creation'}),
+    (x_data, np.log(1 + mtime_counts), {'color': 'green', 'linewidth': LINE_WIDTH, 'label': 'modification'}),
+    (x_data, np.log(1 + atime_counts), {'color': 'blue', 'linewidth': LINE_WIDTH, 'label': 'access'}),
+], title=drive_name, ylabel='Natural logarithm of 1+count', xlabel='Days Starting Monday midnight', legend=True)
 
 print(f'Completed in {round(time() - t0, 3)} seconds.')
 
@@ -212,90 +150,47 @@ print(f'Completed in {round(time() - t0, 3)} seconds.')
 t0 = time()
 print('Generating day usage graph...', end=' ', flush=True)
 
-mtime_counts = [0] * DAY_USAGE_XRES
-atime_counts = [0] * DAY_USAGE_XRES
-ctime_counts = [0] * DAY_USAGE_XRES
-
-get_index = lambda _time: round((DAY_USAGE_XRES - 1) * (((_time.hour * 60 * 60) + \
-    (_time.minute * 60) + _time.second) / (24 * 60 * 60)))
-for mtime, atime, ctime in zip(mtimes, atimes, ctimes):
-    mtime_counts[get_index(mtime)] += 1
-    atime_counts[get_index(atime)] += 1
-    ctime_counts[get_index(ctime)] += 1
-
-x_data = [(24 / DAY_USAGE_XRES) * i for i in range(DAY_USAGE_XRES)]
-fig, ax = plt.subplots()
-ax.set_title('Day Usage')
-ax.set_ylabel('Natural logarithm of 1+count')
-ax.set_xlabel('Hours of Day')
+with stage('bin', graph='days', rows=len(mac_times)):
+    ctime_counts, mtime_counts, atime_counts = mac_times.daily(DAY_USAGE_XRES)
 
 # create the x-axis
+x_data = [(24 / DAY_USAGE_XRES) * i for i in range(DAY_USAGE_XRES)]
 LINE_WIDTH = .75
-y_data = [log(1 + count, e) for count in ctime_counts]
-ax.plot(x_data, y_data, color="red", linewidth=LINE_WIDTH, label='creation')
-y_data = [log(1 + count, e) for count in mtime_counts]
-ax.plot(x_data, y_data, color="green", linewidth=LINE_WIDTH, label='modification')
-y_data = [log(1 + count, e) for count in atime_counts]
-ax.plot(x_data, y_data, color="blue", linewidth=LINE_WIDTH, label='access')
-
-plt.legend()
-plt.savefig(join(output_dir, f'{drive_name}-days'))
-plt.close()
+renderer.submit(save_line_figure, join(output_dir, f'{drive_name}-days'), [
+    (x_data, np.log(1 + ctime_counts), {'color': 'red', 'linewidth': LINE_WIDTH, 'label': 'creation'}),
+    (x_data, np.log(1 + mtime_counts), {'color': 'green', 'linewidth': LINE_WIDTH, 'label': 'modification'}),
+    (x_data, np.log(1 + atime_counts), {'color': 'blue', 'linewidth': LINE_WIDTH, 'label': 'access'}),
+], title='Day Usage', ylabel='Natural logarithm of 1+count', xlabel='Hours of Day', legend=True)
 
 print(f'Completed in {round(time() - t0, 3)} seconds.')
 
 # Create the hour usage graph -----------------------------------------------
 t0 = time()
 print('Generating hour usage graph...', end=' ', flush=True)
-mtime_counts = [0] * HOUR_USAGE_XRES
-atime_counts = [0] * HOUR_USAGE_XRES
-ctime_counts = [0] * HOUR_USAGE_XRES
-
-get_index = lambda _time: round((HOUR_USAGE_XRES - 1) * ((
-    (_time.minute * 60) + _time.second) / (60 * 60)))
-for mtime, atime, ctime in zip(mtimes, atimes, ctimes):
-    mtime_counts[get_index(mtime)] += 1
-    atime_counts[get_index(atime)] += 1
-    ctime_counts[get_index(ctime)] += 1
-
-x_data = [(60 / HOUR_USAGE_XRES) * i for i in range(HOUR_USAGE_XRES)]
-fig, ax = plt.subplots()
-ax.set_title('Hour Usage')
-ax.set_ylabel('Natural logarithm of 1+count')
-ax.set_xlabel('Minutes in Hour')
+with stage('bin', graph='hours', rows=len(mac_times)):
+    ctime_counts, mtime_counts, atime_counts = mac_times.hourly(HOUR_USAGE_XRES)
 
 # create the x-axis
+x_data = [(60 / HOUR_USAGE_XRES) * i for i in range(HOUR_USAGE_XRES)]
 LINE_WIDTH = .75
-y_data = [log(1 + count, e) for count in ctime_counts]
-ax.plot(x_data, y_data, color="red", linewidth=LINE_WIDTH, label='creation')
-y_data = [log(1 + count, e) for count in mtime_counts]
-ax.plot(x_data, y_data, color="green", linewidth=LINE_WIDTH, label='modification')
-y_data = [log(1 + count, e) for count in atime_counts]
-ax.plot(x_data, y_data, color="blue", linewidth=LINE_WIDTH, label='access')
-
-plt.legend()
-plt.savefig(join(output_dir, f'{drive_name}-hours'))
-plt.close()
+renderer.submit(save_line_figure, join(output_dir, f'{drive_name}-hours'), [
+    (x_data, np.log(1 + ctime_counts), {'color': 'red', 'linewidth': LINE_WIDTH, 'label': 'creation'}),
+    (x_data, np.log(1 + mtime_counts), {'color': 'green', 'linewidth': LINE_WIDTH, 'label': 'modification'}),
+    (x_data, np.log(1 + atime_counts), {'color': 'blue', 'linewidth': LINE_WIDTH, 'label': 'access'}),
+], title='Hour Usage', ylabel='Natural logarithm of 1+count', xlabel='Minutes in Hour', legend=True)
 
 print(f'Completed in {round(time() - t0, 3)} seconds.')
 
 # Create the depths graph --------------------------------------------------
 t0 = time()
 print('Generating file depths graph...', end=' ', flush=True)
-depth_counts = [0] * (max(depths))
-for depth in depths:
-    depth_counts[depth - 1] += 1
+with stage('bin', graph='depth-of-files', rows=len(depths)):
+    depth_counts = depth_bins(depths)
 
 x_data = [i for i in range(1, len(depth_counts) + 1)]
-y_data = [log(1 + count, e) for count in depth_counts]
-fig, ax = plt.subplots()
-ax.set_title('Depth of Files')
-ax.set_ylabel('Natural logarithm of 1+count')
-ax.set_xlabel('Depth in file hierarchy')
-ax.plot(x_data, y_data, linewidth=1)
-
-plt.savefig(join(output_dir, f'{drive_name}-depth-of-files'))
-plt.close()
+y_data = np.log(1 + depth_counts)
+renderer.submit(save_line_figure, join(output_dir, f'{drive_name}-depth-of-files'), [(x_data, y_data, {'linewidth': 1})],
+                title='Depth of Files', ylabel='Natural logarithm of 1+count', xlabel='Depth in file hierarchy')
 
 print(f'Completed in {round(time() - t0, 3)} seconds.')
 
@@ -303,27 +198,16 @@ print(f'Completed in {round(time() - t0, 3)} seconds.')
 t0 = time()
 print('Generating file size distribution graph...', end=' ', flush=True)
 
-file_size_counts = [0] * SIZE_DISTRIBUTION_XRES
-
-file_sizes = [log(1 + size, e) for size in sizes] # convert to natural log value
-max_size = max(file_sizes)
-
-get_index = lambda size: round((len(file_size_counts) - 1) * (size / max_size))
-
-for size in file_sizes:
-    file_size_counts[get_index(size)] += 1
+# bin the natural log of the sizes
+with stage('bin', graph='size-distribution', rows=len(sizes)):
+    file_size_counts, max_size = log_size_bins(sizes, SIZE_DISTRIBUTION_XRES)
 
 x_data = [(max_size / len(file_size_counts)) * i for i in range(len(file_size_counts))]
-y_data = [log(1 + i, e) for i in file_size_counts]
+y_data = np.log(1 + file_size_counts)
 
-fig, ax = plt.subplots()
-ax.set_title('Distribution of File Sizes')
-ax.set_ylabel('Natural logarithm of 1+count')
-ax.set_xlabel('Natural logarithm of 1+size in bytes')
-ax.plot(x_data, y_data, linewidth=1)
-
-plt.savefig(join(output_dir, f'{drive_name}-size-distribution'))
-plt.close()
+renderer.submit(save_line_figure, join(output_dir, f'{drive_name}-size-distribution'), [(x_data, y_data, {'linewidth': 1})],
+                title='Distribution of File Sizes', ylabel='Natural logarithm of 1+count',
+                xlabel='Natural logarithm of 1+size in bytes')
 
 print(f'Completed in {round(time() - t0, 3)} seconds.')
 
@@ -331,18 +215,13 @@ print(f'Completed in {round(time() - t0, 3)} seconds.')
 t0 = time()
 print('Generating file extensions count graph...', end=' ', flush=True)
 
-extensions = defaultdict(int)
 NO_EXT = 'no extension'
-for file_path in file_paths:
-    file_name = basename(file_path).lower()
-    dot_index = file_name.rfind('.')
-    if dot_index > -1:
-        extensions[file_name[dot_index + 1:]] += 1
-    else:
-        extensions[NO_EXT] += 1
+with stage('bin', graph='extension-counts', rows=len(cols)):
+    codes, labels = cols.categories('suffix', {None: NO_EXT})
+    counts = np.bincount(codes, minlength=len(labels))
+    extensions = [(labels[c], int(counts[c])) for c in ordered_groups(codes)]
 
 # Sort the data:
-extensions = [(k, v) for k, v in extensions.items()]
 extensions.sort(key=lambda i: i[1], reverse=True)
 
 # Write to file:
@@ -353,3 +232,10 @@ with open(join(output_dir, f'{drive_name}-extension-counts.csv'), 'w') as file:
 
 
 print(f"Completed in {round(time() - t0, 3)} seconds.")
+
+# Wait for the figures to be drawn ----------------------------------------------
+t0 = time()
+print('Rendering graphs...', end=' ', flush=True)
+with stage('render'):
+    renderer.close()
+print(f"Completed in {round(time() - t0, 3)} seconds.")
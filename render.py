@@ -0,0 +1,90 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, get_all_start_methods
+from os import environ, cpu_count
+import matplotlib
+
+# Figures are described as plain data (series, labels, output path) and drawn by
+# save_line_figure() in a pool of worker processes on the Agg backend, so the caller can
+# keep computing the next series while earlier figures render. Workers are forked, which
+# keeps scripts without a __main__ guard (plot.py) from being re-executed in them. Where
+# fork is not available, or RENDER_JOBS=1, figures are drawn in the calling process.
+
+def get_jobs():
+    return int(environ.get('RENDER_JOBS', 0)) or cpu_count() or 1
+
+def use_agg():
+    matplotlib.use('Agg')
+
+def save_line_figure(file_path: str, lines: list, title: str=None, xlabel: str=None, ylabel: str=None,
+                     xlabel_size=None, xtick_rotation=None, legend: bool=False, legend_labels: list=None,
+                     legend_kwargs: dict=None, bbox_inches=None):
+    # lines is a list of (x data, y data, plot keyword arguments)
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    if title is not None:
+        ax.set_title(title)
+    if ylabel is not None:
+        ax.set_ylabel(ylabel)
+    if xlabel is not None:
+        if xlabel_size is not None:
+            ax.set_xlabel(xlabel, fontsize=xlabel_size)
+        else:
+            ax.set_xlabel(xlabel)
+    if xtick_rotation is not None:
+        plt.setp(ax.get_xticklabels(), rotation=xtick_rotation)
+
+    for x_data, y_data, kwargs in lines:
+        ax.plot(x_data, y_data, **kwargs)
+
+    if legend:
+        if legend_labels is not None:
+            ax.legend(legend_labels, **(legend_kwargs or {}))
+        else:
+            ax.legend(**(legend_kwargs or {}))
+
+    if bbox_inches is not None:
+        fig.savefig(file_path, bbox_inches=bbox_inches)
+    else:
+        fig.savefig(file_path)
+    plt.close(fig)
+
+class Renderer:
+    def __init__(self, jobs: int=None):
+        self.jobs = jobs or get_jobs()
+        self._pool = None
+        self._futures = []
+
+    def start(self):
+        if self.jobs > 1 and 'fork' in get_all_start_methods():
+            self._pool = ProcessPoolExecutor(self.jobs, mp_context=get_context('fork'), initializer=use_agg)
+        return self
+
+    def submit(self, fn, *args, **kwargs):
+        if self._pool is None:
+            fn(*args, **kwargs)
+        else:
+            self._futures.append(self._pool.submit(fn, *args, **kwargs))
+
+    def wait(self):
+        # re-raises the first error from a worker
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        if self._pool is not None:
+            try:
+                self.wait()
+            finally:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        self.close()
@@ -0,0 +1,133 @@
+from sys import argv
+from time import time
+from os import mkdir
+from os.path import exists
+import numpy as np
+from columns import open_columns, count_by_category, group_rows
+from outindex import OutIndex
+from categories import get_extensions
+from render import Renderer
+from instrument import stage
+
+# Runs any number of graph reports over a .out file in a single pass. Each report is an
+# accumulator: range reports get their rows from the sorted column index, the others share
+# one block by block read of the columnar cache. Then each report writes its graphs and
+# path lists. The graphs of all reports are rendered in parallel while the path lists are
+# written.
+
+BLOCK_ROWS = 1 << 20
+CATEGORIES = [('topdir', 'topdirs'), ('botdir', 'botdirs'), ('ext', 'extensions')]
+
+class RangeReport:
+    # graphs and path lists of files by topdir, botdir and extension category over a range
+    # of one column. Subclasses set column and x_data and implement bounds(), bins(),
+    # get_base_dir(), make_graph() and create_path_list().
+    column = None
+
+    def __init__(self):
+        self._rows = []
+        self._bins = []
+
+    def select(self, values):
+        lo, hi = self.bounds()
+        return (values >= lo) & (values <= hi)
+
+    def add_rows(self, cols, rows: np.ndarray):
+        self._rows.append(rows)
+        self._bins.append(self.bins(cols[self.column][rows]))
+
+    def accumulate(self, cols, start: int, stop: int):
+        self.add_rows(cols, np.flatnonzero(self.select(cols[self.column][start:stop])) + start)
+
+    def finish(self, cols, file_name: str, renderer):
+        rows = np.concatenate(self._rows) if self._rows else np.empty(0, dtype=np.int64)
+        index = np.concatenate(self._bins).astype(np.int64) if self._bins else rows
+
+        base_dir = self.get_base_dir(file_name)
+        if not exists(base_dir):
+            mkdir(base_dir)
+
+        grouped = []
+        for name, category in CATEGORIES:
+            codes, labels = cols.categories(name, get_extensions())
+            codes = codes[rows]
+            self.make_graph(category, count_by_category(codes, labels, index, len(self.x_data)), base_dir, renderer)
+            grouped.append((category, group_rows(codes, labels, rows)))
+
+        for category, grouped_rows in grouped:
+            self.create_path_list(cols, grouped_rows, category, base_dir)
+
+def run_reports(file_name: str, reports: list, use_index: bool=True):
+    with stage('load', file=file_name) as s:
+        cols = open_columns(file_name)
+        s.rows = len(cols)
+
+    # range reports look up their rows in the index, which is built on first use. They
+    # are recognised by their bounds() rather than by class, because run as a script this
+    # module's RangeReport is __main__.RangeReport, not the one the reports subclass.
+    index = OutIndex(cols)
+    scanned = []
+    with stage('select') as s:
+        for report in reports:
+            if use_index and hasattr(report, 'bounds'):
+                rows = index.rows(report.column, *report.bounds())
+                report.add_rows(cols, rows)
+                s.rows += len(rows)
+            else:
+                scanned.append(report)
+
+    if scanned:
+        with stage('scan', reports=len(scanned)) as s:
+            for start in range(0, len(cols), BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, len(cols))
+                for report in scanned:
+                    report.accumulate(cols, start, stop)
+            s.rows = len(cols)
+
+    with stage('write', reports=len(reports)), Renderer() as renderer:
+        for report in reports:
+            report.finish(cols, file_name, renderer)
+
+def parse_spec(spec: str):
+    # size:<min log>:<max log>, depth:<min>:<max>, inode:<min>:<max> or
+    # time:<year|week|hour|min>:<start>:<end>[:<timezone>]
+    from make_size_graphs import SizeReport
+    from make_depth_graphs import DepthReport
+    from make_inodes_graph import InodeReport
+    from make_time_graphs import TimeReport
+
+    report_types = {
+        'size': SizeReport,
+        'depth': DepthReport,
+        'inode': InodeReport,
+        'time': TimeReport,
+    }
+    kind, *args = spec.split(':')
+    if kind not in report_types:
+        raise ValueError(f'Unknown report type {kind} in {spec}')
+    return report_types[kind](*args)
+
+def load_specs(args: list):
+    # specs are given as arguments, or one per line in a file passed as @<file>
+    specs = []
+    for arg in args:
+        if arg.startswith('@'):
+            with open(arg[1:], 'r') as file:
+                specs.extend(line.strip() for line in file if line.strip() and not line.startswith('#'))
+        else:
+            specs.append(arg)
+    return [parse_spec(spec) for spec in specs]
+
+
+if __name__ == '__main__':
+    if len(argv) < 3:
+        print('Usage: reports.py <out file> <spec|@spec file> [<spec|@spec file> ...]')
+        print('Specs: size:<min log>:<max log>, depth:<min>:<max>, inode:<min>:<max>,')
+        print('       time:<year|week|hour|min>:<start>:<end>[:<timezone>]')
+        exit()
+
+    t0 = time()
+    reports = load_specs(argv[2:])
+    print(f'Running {len(reports)} report(s) on {argv[1]}...', flush=True)
+    run_reports(argv[1], reports)
+    print(f'Completed in {round(time() - t0, 3)} seconds.')
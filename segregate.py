@@ -1,6 +1,24 @@
-from os.path import join, exists, size
-from os import mkdir
-drive_names = {
+from os.path import join, exists, getsize
+from os import mkdir, remove
+from io import BytesIO
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from shutil import copyfileobj
+from time import time
+import argparse
+from instrument import stage
+from compressed import open_file, is_compressed, get_suffix, find_line_ranges
+
+# Splits the bigtable into one .out file per drive, on the drive id in the third field.
+# The file is read in large binary blocks of whole lines; each block is grouped by drive
+# and written with one write per drive. With more than one job the bigtable is cut into
+# line aligned byte ranges that are split in parallel into part files, which are then
+# concatenated in order so the output matches a sequential run. A compressed bigtable
+# cannot be cut into byte ranges and is split in one pass while it is decompressed in a
+# separate process. Compressed outputs are written part by part and the compressed parts
+# concatenated, which is still one valid gzip or zstd file.
+
+DRIVE_NAMES = {
     "1164": "IN133-1002",
     "1050": "IN11-120",
     "1083": "IN112-1001",
@@ -8,19 +26,127 @@ drive_names = {
     "1903": "SG001-1007",
     "4101": "UK001-0007",
 }
-# create the folder 'output' if it does not exist
-if not exists('output'):
-    mkdir('output')
-
-# open the output files for writing and store them in a dictionary
-out_files = {k: open(join('output', f"{v}.out"), "w") for k, v in drive_names.items()}
-
-# open the bigtable.out file for reading
-with open("col2_values_bigtable.out", "r") as file:
-    # read each line and write them to the corresponding file
-    for line in file:
-        data = line.split('|')
-        out_files[data[2]].write(line)
-# close the output files
-for file in out_files.values():
-    file.close()
+BIGTABLE = 'col2_values_bigtable.out'
+OUTPUT_DIR = 'output'
+UNKNOWN_DRIVE = 'unknown'   # output for lines with a drive id that is not in the map
+DRIVE_INDEX = 2
+BLOCK_SIZE = 1 << 24
+
+def load_drive_names(file_path: str):
+    # same format as extensions.txt: one '<drive id> <drive name>' per line
+    drive_names = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.split()
+            if len(line) >= 2:
+                drive_names[line[0]] = line[1]
+    return drive_names
+
+def get_output_path(out_dir: str, name: str, part: int=None, suffix: str=''):
+    # suffix is the compression extension of the outputs, if any
+    path = join(out_dir, f"{name}.out")
+    if part is not None:
+        path += f".part{part}"
+    return path + suffix
+
+def read_blocks(file, start: int=0, end: int=None, block_size: int=BLOCK_SIZE):
+    # yield blocks of whole lines from the byte range [start, end), or to the end of the
+    # file if end is None
+    if start:
+        file.seek(start)
+    pos = start
+    rest = b''
+    while end is None or pos < end:
+        block = file.read(block_size if end is None else min(block_size, end - pos))
+        if not block:
+            break
+        pos += len(block)
+        cut = block.rfind(b'\n') + 1
+        if cut == 0:
+            rest += block
+            continue
+        yield rest + block[:cut]
+        rest = block[cut:]
+    if rest:
+        yield rest
+
+def segregate_range(file_path: str, start: int, end: int, drive_names: dict, out_dir: str, part: int=None,
+                    suffix: str=''):
+    # returns the names of the outputs that were written
+    names = {k.encode(): v for k, v in drive_names.items()}
+    out_files = {}
+    try:
+        with open_file(file_path, 'rb') as file:
+            for block in read_blocks(file, start, end):
+                buffers = defaultdict(list)
+                for line in BytesIO(block):
+                    # only split off the first three fields
+                    fields = line.split(b'|', DRIVE_INDEX + 1)
+                    key = fields[DRIVE_INDEX] if len(fields) > DRIVE_INDEX + 1 else None
+                    buffers[names.get(key, UNKNOWN_DRIVE)].append(line)
+
+                for name, lines in buffers.items():
+                    if name not in out_files:
+                        out_files[name] = open_file(get_output_path(out_dir, name, part, suffix), 'wb')
+                    out_files[name].write(b''.join(lines))
+    finally:
+        for file in out_files.values():
+            file.close()
+    return set(out_files)
+
+def merge_parts(out_dir: str, name: str, parts: list, suffix: str=''):
+    with open(get_output_path(out_dir, name, suffix=suffix), 'wb') as out:
+        for part in parts:
+            part_path = get_output_path(out_dir, name, part, suffix)
+            with open(part_path, 'rb') as file:
+                copyfileobj(file, out, BLOCK_SIZE)
+            remove(part_path)
+
+def segregate(file_path: str, drive_names: dict, out_dir: str, jobs: int=1, compression: str=None):
+    # compression is gz or zst to compress the outputs
+    if jobs > 1 and is_compressed(file_path):
+        jobs = 1
+    with stage('segregate', file=file_path, bytes=getsize(file_path), jobs=jobs):
+        _segregate(file_path, drive_names, out_dir, jobs, get_suffix(compression))
+
+def _segregate(file_path: str, drive_names: dict, out_dir: str, jobs: int, suffix: str):
+    if jobs > 1:
+        chunks = find_line_ranges(file_path, jobs)
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(segregate_range, file_path, start, end, drive_names, out_dir, part, suffix)
+                       for part, (start, end) in enumerate(chunks)]
+            written = [f.result() for f in futures]
+
+        names = set().union(*written)
+        for name in names:
+            merge_parts(out_dir, name, [part for part, w in enumerate(written) if name in w], suffix)
+    else:
+        names = segregate_range(file_path, 0, None, drive_names, out_dir, suffix=suffix)
+
+    # every drive in the map gets a file, even if it has no lines
+    for name in drive_names.values():
+        if name not in names:
+            open_file(get_output_path(out_dir, name, suffix=suffix), 'wb').close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Split the bigtable into one .out file per drive.')
+    parser.add_argument('bigtable', nargs='?', default=BIGTABLE)
+    parser.add_argument('-o', '--output', default=OUTPUT_DIR, help='output folder')
+    parser.add_argument('-d', '--drive-map', metavar='FILE',
+                        help="file with one '<drive id> <drive name>' per line, replacing the built-in map")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of byte ranges of the bigtable to split in parallel (1 for a compressed bigtable)')
+    parser.add_argument('-z', '--compress', choices=['gz', 'zst'], help='compress the outputs')
+    args = parser.parse_args()
+
+    drive_names = load_drive_names(args.drive_map) if args.drive_map else DRIVE_NAMES
+
+    # create the output folder if it does not exist
+    if not exists(args.output):
+        mkdir(args.output)
+
+    t0 = time()
+    print(f'Splitting {args.bigtable}...', end=' ', flush=True)
+    segregate(args.bigtable, drive_names, args.output, args.jobs, args.compress)
+    print(f'completed in {round(time() - t0, 4)} seconds.')
@@ -0,0 +1,78 @@
+import gzip
+import pytest
+from compressed import open_file, detect, strip_suffix, TOOLS_ENV, get_tool
+from outindex import read_lines
+
+LINES = [f'{i}|row {i}|{"x" * (i % 7)}\n' for i in range(20000)]
+
+@pytest.fixture(params=['tools', 'in_process'])
+def tools(request, monkeypatch):
+    if request.param == 'in_process':
+        monkeypatch.setenv(TOOLS_ENV, '0')
+    return request.param
+
+@pytest.mark.parametrize('suffix', ['.gz', '.zst'])
+def test_round_trip(tmp_path, tools, suffix):
+    if suffix == '.zst' and get_tool('zstd') is None:
+        pytest.importorskip('zstandard')
+    path = str(tmp_path / f'rows.out{suffix}')
+    with open_file(path, 'w') as file:
+        file.writelines(LINES)
+    assert detect(path) == ('gzip' if suffix == '.gz' else 'zstd')
+    with open_file(path, 'r') as file:
+        assert file.readlines() == LINES
+
+def test_plain_files_are_untouched(tmp_path):
+    path = str(tmp_path / 'rows.out')
+    with open_file(path, 'w') as file:
+        file.writelines(LINES)
+    assert detect(path) is None
+    with open(path, 'r') as file:
+        assert file.readlines() == LINES
+
+def test_reader_closed_early(tmp_path):
+    # closing before the end stops the decompressor with SIGPIPE, which is not an error
+    if get_tool('zstd') is None:
+        pytest.skip('the zstd command is not installed')
+    path = str(tmp_path / 'rows.out.zst')
+    with open_file(path, 'w') as file:
+        file.writelines(LINES * 20)
+    with open_file(path, 'rb') as file:
+        assert file.readline().decode() == LINES[0]
+
+def test_truncated_file_fails(tmp_path):
+    if get_tool('zstd') is None:
+        pytest.skip('the zstd command is not installed')
+    path = str(tmp_path / 'rows.out.zst')
+    with open_file(path, 'w') as file:
+        file.writelines(LINES)
+    with open(path, 'rb') as file:
+        data = file.read()
+    with open(path, 'wb') as file:
+        file.write(data[:len(data) // 2])
+    with pytest.raises(OSError):
+        with open_file(path, 'rb') as file:
+            file.read()
+
+def test_concatenated_members(tmp_path):
+    path = str(tmp_path / 'rows.out.gz')
+    with open(path, 'wb') as file:
+        file.write(gzip.compress(''.join(LINES[:100]).encode()))
+        file.write(gzip.compress(''.join(LINES[100:]).encode()))
+    with open_file(path, 'r') as file:
+        assert file.readlines() == LINES
+
+def test_read_lines_from_compressed_file(tmp_path):
+    path = str(tmp_path / 'rows.out.gz')
+    with gzip.open(path, 'wt') as file:
+        file.writelines(LINES)
+    offsets = [0]
+    for line in LINES:
+        offsets.append(offsets[-1] + len(line))
+    wanted = [5, 2, 100]
+    assert list(read_lines(path, [offsets[i] for i in wanted])) == [LINES[i] for i in wanted]
+
+def test_strip_suffix():
+    assert strip_suffix('drive.out.gz') == 'drive.out'
+    assert strip_suffix('drive.out.zst') == 'drive.out'
+    assert strip_suffix('drive.out') == 'drive.out'
@@ -0,0 +1,54 @@
+from json import load
+from random import Random
+from benchmark import write_dfxml
+from convert import convert_incremental, convert_file, MANIFEST_SUFFIX
+
+def write_image(tmp_path, name: str='image.xml', rows: int=300, seed: int=1):
+    path = str(tmp_path / name)
+    write_dfxml(path, rows, Random(seed))
+    return path
+
+def read(path: str):
+    with open(path, 'rb') as file:
+        return file.read()
+
+def full_conversion(tmp_path, xml_path: str):
+    out_path = str(tmp_path / 'full.out')
+    convert_file(xml_path, out_path)
+    return read(out_path)
+
+def test_unchanged_file_reuses_every_volume(tmp_path):
+    xml_path = write_image(tmp_path)
+    out_path = str(tmp_path / 'image.out')
+    assert convert_incremental(xml_path, out_path, jobs=1) == (3, 3)
+    assert read(out_path) == full_conversion(tmp_path, xml_path)
+    assert convert_incremental(xml_path, out_path, jobs=1) == (0, 3)
+    assert read(out_path) == full_conversion(tmp_path, xml_path)
+
+def test_changed_volume_and_header(tmp_path):
+    xml_path = write_image(tmp_path)
+    out_path = str(tmp_path / 'image.out')
+    convert_incremental(xml_path, out_path, jobs=1)
+
+    # a new creator block, as every fiwalk run writes, and one changed volume
+    with open(xml_path, 'r') as file:
+        text = file.read()
+    text = text.replace('<creator><program>fiwalk</program></creator>',
+                        '<creator><program>fiwalk</program><start_time>2026-01-01T00:00:00Z</start_time></creator>')
+    last = text.rindex('<inode>')
+    text = text[:last] + '<inode>999999</inode>' + text[text.index('</inode>', last) + len('</inode>'):]
+    with open(xml_path, 'w') as file:
+        file.write(text)
+
+    assert convert_incremental(xml_path, out_path, jobs=1) == (1, 3)
+    assert read(out_path) == full_conversion(tmp_path, xml_path)
+
+def test_edited_out_file_is_reconverted(tmp_path):
+    xml_path = write_image(tmp_path)
+    out_path = str(tmp_path / 'image.out')
+    convert_incremental(xml_path, out_path, jobs=1)
+    with open(out_path, 'ab') as file:
+        file.write(b'extra\n')
+    assert convert_incremental(xml_path, out_path, jobs=1) == (3, 3)
+    with open(out_path + MANIFEST_SUFFIX, 'r') as file:
+        assert len(load(file)['volumes']) == 3
@@ -0,0 +1,49 @@
+from collections import Counter
+from random import Random
+from heavy_hitters import SpaceSaving, top_items
+
+def zipf_stream(n: int, items: int, seed: int):
+    rng = Random(seed)
+    return [f'item{int(rng.paretovariate(1.0)) % items}' for _ in range(n)]
+
+def check_bounds(summary: SpaceSaving, true: Counter):
+    # every kept count is an overestimate by at most its error
+    for item, count in summary.counts.items():
+        assert count - summary.errors[item] <= true[item] <= count
+
+def test_exact_when_everything_fits():
+    stream = zipf_stream(5000, 50, 1)
+    summary = SpaceSaving(100)
+    summary.update(stream)
+    assert summary.counts == Counter(stream)
+    assert summary.top(5) == top_items(Counter(stream), 5)
+
+def test_heavy_hitters_are_kept():
+    stream = zipf_stream(20000, 5000, 2)
+    true = Counter(stream)
+    summary = SpaceSaving(50)
+    summary.update(stream)
+    check_bounds(summary, true)
+    for item, count in true.items():
+        if count > len(stream) / 50:
+            assert item in summary.counts
+
+def test_merge():
+    first, second = zipf_stream(10000, 3000, 3), zipf_stream(10000, 3000, 4)
+    true = Counter(first) + Counter(second)
+    a, b = SpaceSaving(60), SpaceSaving(60)
+    a.update(first)
+    b.update(second)
+    a.merge(b)
+    assert len(a) <= 60
+    check_bounds(a, true)
+    for item, count in true.items():
+        if count > (len(first) + len(second)) / 60:
+            assert item in a.counts
+
+def test_merge_exact_when_everything_fits():
+    first, second = zipf_stream(3000, 40, 5), zipf_stream(3000, 40, 6)
+    a, b = SpaceSaving(100), SpaceSaving(100)
+    a.update(first)
+    b.update(second)
+    assert a.merge(b).counts == Counter(first) + Counter(second)
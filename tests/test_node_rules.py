@@ -0,0 +1,105 @@
+import pytest
+from node_rules import NodeClassifier, load_rules
+
+NAMES = ['shepherd, denise', 'ann@example.com', 'bob@mail.example.com', 'eve@notexample.com',
+         'escada team', 'abx', 'abbx', 'aab', 'xyz', 'XYZ', 'abc', 'ABC', 'zz', '']
+
+def one_by_one(rules: list, name: str):
+    # colour of the first rule whose own regex matches, without the combined matcher
+    classifier = NodeClassifier(rules)
+    for regex, color in zip(classifier.regexes, classifier.colors):
+        if regex.match(name):
+            return color
+    return None
+
+def check_against_one_by_one(rules: list):
+    classifier = NodeClassifier(rules)
+    for name in NAMES:
+        assert classifier.color(name) == one_by_one(rules, name), name
+    return classifier
+
+def test_each_rule_kind():
+    classifier = check_against_one_by_one([
+        ('exact', 'Shepherd, Denise', 'green'),
+        ('substring', 'escada', 'orange'),
+        ('regex', r'a+b+x', 'red'),
+        ('domain', '@example.com', 'blue'),
+    ])
+    assert classifier.matcher is not None
+    assert classifier.color('shepherd, denise') == 'green'
+    assert classifier.color('shepherd, denise jr') is None
+    assert classifier.color('the escada team') == 'orange'
+    assert classifier.color('xabbx') == 'red'
+    assert classifier.color('ann@example.com') == 'blue'
+    assert classifier.color('bob@mail.example.com') == 'blue'
+    assert classifier.color('eve@notexample.com') is None
+    assert classifier.style('zz') == {}
+    assert classifier.style('ann@example.com') == {'color': 'blue'}
+
+def test_first_match_wins():
+    classifier = check_against_one_by_one([
+        ('substring', '@', 'gray'),
+        ('domain', 'example.com', 'blue'),
+        ('exact', 'ann@example.com', 'green'),
+    ])
+    assert classifier.color('ann@example.com') == 'gray'
+
+    classifier = check_against_one_by_one([
+        ('exact', 'ann@example.com', 'green'),
+        ('domain', 'example.com', 'blue'),
+        ('substring', '@', 'gray'),
+    ])
+    assert classifier.color('ann@example.com') == 'green'
+    assert classifier.color('bob@mail.example.com') == 'blue'
+    assert classifier.color('eve@notexample.com') == 'gray'
+
+def test_regexes_with_their_own_groups():
+    # the groups of a rule's regex must not shift which rule lastindex maps to
+    rules = [
+        ('regex', r'(a)(b)?(?:x|y)', 'red'),
+        ('regex', r'((a)b)(b)x', 'green'),
+        ('substring', 'zz', 'blue'),
+        ('regex', r'(x)(y)(z)', 'yellow'),
+    ]
+    classifier = check_against_one_by_one(rules)
+    assert classifier.matcher is not None
+    assert classifier.color('abx') == 'red'
+    assert classifier.color('abbx') == 'green'
+    assert classifier.color('zz') == 'blue'
+    assert classifier.color('xyz') == 'yellow'
+
+def test_inline_flags_are_scoped_to_their_rule():
+    classifier = check_against_one_by_one([
+        ('regex', '(?i)ABC', 'red'),
+        ('regex', 'xyz', 'blue'),
+    ])
+    assert classifier.color('abc') == 'red'
+    assert classifier.color('ABC') == 'red'
+    assert classifier.color('xyz') == 'blue'
+    assert classifier.color('XYZ') is None
+
+@pytest.mark.parametrize('pattern', [r'(.)\1', r'(?P<c>.)(?P=c)', r'(?P<c>a)b?'])
+def test_self_referencing_regexes_fall_back(pattern):
+    classifier = check_against_one_by_one([
+        ('exact', 'zz', 'blue'),
+        ('regex', pattern, 'red'),
+        ('substring', 'b', 'green'),
+    ])
+    assert classifier.matcher is None
+    assert classifier.color('zz') == 'blue'
+    assert classifier.color('aab') == 'red'
+
+def test_bad_rules():
+    with pytest.raises(ValueError, match='Rule 2'):
+        NodeClassifier([('exact', 'a', 'red'), ('regex', '(unclosed', 'blue')])
+    with pytest.raises(ValueError, match='Unknown rule type'):
+        NodeClassifier([('glob', '*', 'red')])
+
+def test_load_rules(tmp_path):
+    rules_file = tmp_path / 'rules.txt'
+    rules_file.write_text('# comment\n\nregex | a|b | red\ndomain|example.com|blue\n')
+    assert load_rules(str(rules_file)) == [('regex', 'a|b', 'red'), ('domain', 'example.com', 'blue')]
+
+    rules_file.write_text('exact|a|red\nregex|(a|blue\n')
+    with pytest.raises(ValueError, match=f'{rules_file}:2:'):
+        load_rules(str(rules_file))
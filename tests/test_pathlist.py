@@ -0,0 +1,45 @@
+from random import Random
+import numpy as np
+import pytest
+from pathlist import iter_by_path, iter_sorted_paths
+
+class PathColumns:
+    # the paths() of the columnar cache over a list of paths
+    def __init__(self, paths: list):
+        self._paths = paths
+
+    def paths(self, rows: np.ndarray):
+        return [self._paths[row] for row in rows.tolist()]
+
+def make_paths(n: int, seed: int):
+    # few distinct paths, so most have duplicates spread over several runs
+    rng = Random(seed)
+    dirs = ['/', '/a/', '/a/b/', '/b/', '/é/']
+    return [f'{rng.choice(dirs)}{rng.choice("xyz")}' for _ in range(n)]
+
+@pytest.mark.parametrize('budget', [1, 2, 7, 50, 500])
+def test_spilled_runs_merge_like_the_in_memory_sort(budget):
+    paths = make_paths(200, 1)
+    cols = PathColumns(paths)
+    rows = np.arange(len(paths))[::-1][::2].copy()
+    # the value of each row is its position, so equal paths must keep their original order
+    values = lambda positions: positions.tolist()
+
+    expected = sorted(zip(cols.paths(rows), range(len(rows))), key=lambda item: item[0])
+    result = list(iter_by_path(cols, rows, values, budget))
+    # runs store the values as text
+    assert [(path, int(value)) for path, value in result] == expected
+
+def test_sorted_by_keys_in_file_order():
+    paths = make_paths(50, 2)
+    cols = PathColumns(paths)
+    rows = np.arange(len(paths))
+    keys = np.array([i % 4 for i in range(len(paths))])
+    expected = [(paths[i], int(keys[i])) for i in sorted(range(len(paths)), key=lambda i: keys[i])]
+    for budget in (1, 3, 50):
+        assert list(iter_sorted_paths(cols, rows, keys, budget=budget)) == expected
+
+def test_empty():
+    cols = PathColumns([])
+    rows = np.arange(0)
+    assert list(iter_sorted_paths(cols, rows, budget=1, values=lambda positions: positions.tolist())) == []
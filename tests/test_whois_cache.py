@@ -0,0 +1,56 @@
+import pytest
+from whois_cache import WhoisCache, lookup_domains
+
+REGISTERED = {'example.com': 'EXAMPLE.COM', 'mail.example.com': 'EXAMPLE.COM'}
+
+class StubResolver:
+    # answers from REGISTERED, None for other domains, and raises for the failing ones
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def __call__(self, domain: str):
+        self.calls.append(domain)
+        if domain in self.failing:
+            raise TimeoutError(domain)
+        return REGISTERED.get(domain)
+
+@pytest.fixture
+def cache(tmp_path):
+    with WhoisCache(str(tmp_path / 'whois.sqlite'), ttl=100, negative_ttl=10) as cache:
+        yield cache
+
+def test_lookup_caches_results(cache):
+    resolver = StubResolver()
+    domains = ['example.com', 'unknown.org', 'mail.example.com']
+    assert lookup_domains(domains, cache, resolver, jobs=2) == {
+        'example.com': 'EXAMPLE.COM', 'unknown.org': None, 'mail.example.com': 'EXAMPLE.COM'}
+    assert sorted(resolver.calls) == sorted(domains)
+
+    resolver = StubResolver()
+    assert lookup_domains(domains, cache, resolver)['unknown.org'] is None
+    assert resolver.calls == []
+
+def test_registered_and_negative_ttl(cache):
+    cache.put({'example.com': 'EXAMPLE.COM', 'unknown.org': None}, now=1000)
+    assert cache.get(['example.com', 'unknown.org'], now=1005) == {'example.com': 'EXAMPLE.COM', 'unknown.org': None}
+    # the negative result expires first
+    assert cache.get(['example.com', 'unknown.org'], now=1050) == {'example.com': 'EXAMPLE.COM'}
+    assert cache.get(['example.com', 'unknown.org'], now=1101) == {}
+
+def test_failed_lookups_are_not_cached(cache, capsys):
+    resolver = StubResolver(failing={'example.com'})
+    assert lookup_domains(['example.com', 'unknown.org'], cache, resolver) == {'example.com': None, 'unknown.org': None}
+    assert '1 WHOIS lookup(s) failed' in capsys.readouterr().err
+    assert cache.get(['example.com', 'unknown.org']) == {'unknown.org': None}
+
+    resolver = StubResolver()
+    assert lookup_domains(['example.com', 'unknown.org'], cache, resolver)['example.com'] == 'EXAMPLE.COM'
+    assert resolver.calls == ['example.com']
+
+def test_import_error_is_raised(cache):
+    def resolver(domain: str):
+        import whois_module_that_is_not_installed
+    with pytest.raises(ImportError):
+        lookup_domains(['example.com'], cache, resolver)
+    assert cache.get(['example.com']) == {}
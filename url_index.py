@@ -0,0 +1,111 @@
+from os.path import join, basename, isdir, exists
+from os import listdir, remove, replace
+from sys import argv
+from time import time
+import sqlite3
+
+# Category index of the url blacklists. The blacklist tree under URLS_HOME, where each
+# file lists one domain per line and is categorised by the folder it is in, is loaded
+# once into a SQLite table keyed by domain. Lookups fall back to the parent domains of
+# a host, so 'sub.example.com' gets the category of 'example.com'.
+
+URLS_HOME = '/home/jp/Documents/Programming/Java/spring/projects/ws-cybersecurity-audit/vapt-audit-files-loader/res/urls/'
+INDEX_FILE = 'urls-index.sqlite'
+SQL_BATCH = 100000
+
+def iter_urls(file_path: str):
+    # (domain, category) for each line of the blacklist files under file_path
+    category = basename(file_path.rstrip('/'))
+    for file in listdir(file_path):
+        full_path = join(file_path, file)
+        if isdir(full_path):
+            yield from iter_urls(full_path)
+        else:
+            with open(full_path, 'r', errors='replace') as text_file:
+                for line in text_file:
+                    line = line.strip().lower()
+                    if line:
+                        yield line, category
+
+def build_index(urls_home: str=URLS_HOME, index_path: str=INDEX_FILE):
+    # built next to the index and moved in place, so readers never see a partial index
+    tmp_path = index_path + '.tmp'
+    if exists(tmp_path):
+        remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('CREATE TABLE urls (domain TEXT PRIMARY KEY, category TEXT NOT NULL) WITHOUT ROWID')
+        batch = []
+        for row in iter_urls(urls_home):
+            batch.append(row)
+            if len(batch) >= SQL_BATCH:
+                conn.executemany('INSERT OR REPLACE INTO urls VALUES (?, ?)', batch)
+                batch = []
+        conn.executemany('INSERT OR REPLACE INTO urls VALUES (?, ?)', batch)
+        conn.commit()
+    finally:
+        conn.close()
+    replace(tmp_path, index_path)
+
+def is_ip(host: str):
+    if host.startswith('['):
+        return True
+    parts = host.split('.')
+    return len(parts) == 4 and all(p.isdigit() and len(p) <= 3 for p in parts)
+
+def parent_domains(host: str):
+    # host and its parent domains with at least two labels; IP addresses only as is
+    yield host
+    if is_ip(host):
+        return
+    i = host.find('.')
+    while i > -1 and host.find('.', i + 1) > -1:
+        host = host[i + 1:]
+        yield host
+        i = host.find('.')
+
+class UrlIndex:
+    def __init__(self, index_path: str=INDEX_FILE):
+        # read only, so a missing index is an error instead of an empty new database
+        self.conn = sqlite3.connect(f'file:{index_path}?mode=ro', uri=True)
+        self._categories = {}
+
+    def category(self, host: str):
+        try:
+            return self._categories[host]
+        except KeyError:
+            pass
+        category = None
+        for domain in parent_domains(host):
+            row = self.conn.execute('SELECT category FROM urls WHERE domain = ?', (domain,)).fetchone()
+            if row:
+                category = row[0]
+                break
+        self._categories[host] = category
+        return category
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == '__main__':
+    # url_index.py build [urls home] [index]  |  url_index.py lookup <index> <host>...
+    if len(argv) < 2 or argv[1] not in ('build', 'lookup'):
+        print('Usage: url_index.py build [urls home] [index] | lookup <index> <host>...')
+    elif argv[1] == 'build':
+        t0 = time()
+        print('Building url index... ', end='', flush=True)
+        build_index(*argv[2:4])
+        print(f'completed in {round(time() - t0, 4)}')
+    else:
+        with UrlIndex(argv[2]) as index:
+            for host in argv[3:]:
+                print(f"{host}|{index.category(host)}")
@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from importlib import import_module
+from os import environ
+from time import time
+import sqlite3
+import sys
+
+# WHOIS lookups with an on-disk cache. Results are kept in a SQLite file: registered
+# domains for TTL seconds, and domains without a record for NEGATIVE_TTL seconds. Domains
+# that are not cached are looked up by at most WHOIS_JOBS threads through a resolver, which
+# is any function that takes a domain and returns its registered domain name, or None if
+# the domain has no record. A lookup that raises (a timeout, a rate limit) is treated as
+# unregistered for this run but not cached, so it is retried the next time; an ImportError,
+# e.g. python-whois not being installed, stops the run.
+
+CACHE_FILE = 'whois-cache.sqlite'
+TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600
+SQL_BATCH = 500
+FAILED = object()   # result of a lookup that raised
+
+def get_jobs():
+    return int(environ.get('WHOIS_JOBS', 0)) or 8
+
+def whois_resolver(domain: str):
+    from whois import whois
+    from whois.parser import PywhoisError
+    try:
+        name = whois(domain)['domain_name']
+    except PywhoisError:
+        # the WHOIS server has no record of the domain
+        return None
+    if isinstance(name, (list, tuple)):
+        name = name[0] if name else None
+    return str(name) if name else None
+
+def load_resolver(spec: str):
+    # 'module:function', e.g. a local stub used instead of the network
+    module, _, name = spec.partition(':')
+    return getattr(import_module(module), name or 'resolve')
+
+def resolve(resolver, domain: str):
+    try:
+        return resolver(domain)
+    except ImportError:
+        raise
+    except Exception:
+        return FAILED
+
+class WhoisCache:
+    def __init__(self, file_path: str=CACHE_FILE, ttl: float=TTL, negative_ttl: float=NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.conn = sqlite3.connect(file_path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS whois (domain TEXT PRIMARY KEY, name TEXT, checked REAL NOT NULL)')
+
+    def get(self, domains: list, now: float=None):
+        # {domain: name or None} for the domains with a result that has not expired
+        now = time() if now is None else now
+        results = {}
+        for start in range(0, len(domains), SQL_BATCH):
+            batch = domains[start:start + SQL_BATCH]
+            query = ('SELECT domain, name FROM whois WHERE domain IN (%s) '
+                     'AND checked >= CASE WHEN name IS NULL THEN ? ELSE ? END' % ','.join('?' * len(batch)))
+            for domain, name in self.conn.execute(query, (*batch, now - self.negative_ttl, now - self.ttl)):
+                results[domain] = name
+        return results
+
+    def put(self, results: dict, now: float=None):
+        now = time() if now is None else now
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO whois VALUES (?, ?, ?)',
+                                  [(domain, name, now) for domain, name in results.items()])
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def lookup_domains(domains: list, cache: WhoisCache=None, resolver=None, jobs: int=None):
+    # {domain: registered domain name or None} in the order of domains
+    resolver = resolver or whois_resolver
+    now = time()
+    results = cache.get(domains, now) if cache is not None else {}
+    misses = [d for d in domains if d not in results]
+    if misses:
+        with ThreadPoolExecutor(min(jobs or get_jobs(), len(misses))) as pool:
+            found = dict(zip(misses, pool.map(partial(resolve, resolver), misses)))
+        failed = [d for d, name in found.items() if name is FAILED]
+        if failed:
+            print(f'{len(failed)} WHOIS lookup(s) failed and were not cached', file=sys.stderr)
+        if cache is not None:
+            cache.put({d: name for d, name in found.items() if name is not FAILED}, now)
+        results.update((d, None if name is FAILED else name) for d, name in found.items())
+    return {d: results[d] for d in domains}